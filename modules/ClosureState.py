@@ -0,0 +1,127 @@
+import os, json
+import modules.CommitModel as CommitModel
+
+# the closures of tracked candidates kept between runs, so a monitoring job
+# only recomputes the ones a change can reach. A closure is stored with its
+# target revisions, its collision records (the visited commits with their
+# depth), its tasks and its paths. Against the unmerged revisions of the
+# last run a change is one of:
+#  * commits appended after the last run: they follow every target and the
+#    closure only reaches preceding commits, no closure changes
+#  * commits merged since: only the closures visiting one of them change
+#  * commits unmerged again, e.g. by a reverse merge: only the closures
+#    they precede a target of and share a task or a path with change; a
+#    commit changing a directory or copying may relate to any path, it
+#    reaches every closure it precedes a target of
+# Any change of the source, target, range start or ignore settings makes
+# every closure stale.
+
+# set
+def load(state_file):
+	# the state of the last run, an empty one when there is none
+	if not os.path.isfile(state_file):
+		return ClosureState({})
+	with open(state_file, 'r') as fin:
+		return ClosureState(json.load(fin))
+
+
+class ClosureState:
+	def __init__(self, state):
+		self.__state = state
+		self.__state.setdefault('tracked', [])
+		# candidate -> the paths of its closure, as a set once asked for
+		self.__paths = {}
+
+	def candidates(self):
+		return [entry['candidate'] for entry in self.__state['tracked']]
+
+	def track(self, candidate):
+		if not candidate in self.candidates():
+			self.__state['tracked'].append({'candidate': candidate})
+
+	def untrack(self, candidate):
+		self.__state['tracked'] = [entry for entry in self.__state['tracked'] if entry['candidate'] != candidate]
+
+	def closure(self, candidate):
+		# the stored closure of a candidate, None when it has none
+		for entry in self.__state['tracked']:
+			if entry['candidate'] == candidate:
+				return entry.get('closure')
+		return None
+
+	def store(self, candidate, revisions, collisions, tickets, paths):
+		# collisions are the records as json reports write them, files included
+		for entry in self.__state['tracked']:
+			if entry['candidate'] == candidate:
+				entry['closure'] = {
+					'revisions': revisions,
+					'collisions': collisions,
+					'tickets': sorted(tickets),
+					'paths': sorted(paths)
+				}
+				self.__paths.pop(candidate, None)
+
+	def drop(self, candidate):
+		# a closure that cannot be kept current, e.g. of a merged candidate
+		for entry in self.__state['tracked']:
+			if entry['candidate'] == candidate:
+				entry.pop('closure', None)
+				self.__paths.pop(candidate, None)
+
+	def stale(self, commits, unmerged, paths, settings):
+		# the candidates whose stored closure the changes since the last run
+		# can reach; commits are every commit of the range, unmerged the
+		# revisions among them not merged yet
+		if self.__state.get('settings') != settings:
+			return set(self.candidates())
+
+		previous = set(self.__state.get('unmerged', []))
+		head = self.__state.get('head', -1)
+		merged_since = previous.difference(unmerged)
+		unmerged_since = [c for c in commits if c.revision <= head and c.revision in unmerged and not c.revision in previous]
+
+		stale = set()
+		for entry in self.__state['tracked']:
+			closure = entry.get('closure')
+			if closure is None:
+				stale.add(entry['candidate'])
+				continue
+			limit = max(closure['revisions'])
+			visited = set(closure['revisions']).union([co['revision'] for co in closure['collisions']])
+			if len(visited.intersection(merged_since)) > 0:
+				stale.add(entry['candidate'])
+				continue
+			for c in unmerged_since:
+				if c.revision < limit and self.__reaches(entry['candidate'], closure, c, paths):
+					stale.add(entry['candidate'])
+					break
+		return stale
+
+	def advance(self, commits, unmerged, settings):
+		# records the log the closures are current with
+		self.__state['settings'] = settings
+		self.__state['head'] = max([c.revision for c in commits]) if len(commits)>0 else -1
+		self.__state['unmerged'] = sorted(unmerged)
+
+	def save(self, state_file):
+		# written aside and renamed, a crash never leaves half a state
+		with open(state_file + '.tmp', 'w') as fout:
+			json.dump(self.__state, fout)
+		os.replace(state_file + '.tmp', state_file)
+
+	def __reaches(self, candidate, closure, c, paths):
+		if c.opnumber in closure['tickets'] or len(c.copies)>0:
+			return True
+		if len([action for action in c.actions if action in CommitModel.STRUCTURAL_ACTIONS])>0:
+			return True
+		closure_paths = self.__paths.get(candidate)
+		if closure_paths is None:
+			closure_paths = self.__paths[candidate] = set(closure['paths'])
+		for file_id in c.files:
+			file_path = paths.path(file_id)
+			# the path itself or a directory above it
+			while len(file_path)>0:
+				if file_path in closure_paths:
+					return True
+				file_path = file_path[:file_path.rfind('/')]
+		return False
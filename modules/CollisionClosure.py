@@ -0,0 +1,221 @@
+import bisect, array
+from collections import deque
+import modules.CommitModel as CommitModel
+
+# set
+def create(commits, index, ignored_files, ignored_revisions):
+	return CollisionClosure(commits, index, ignored_files, ignored_revisions)
+
+# the closure of a batch worker process, set up once by initWorker
+_worker_closure = None
+
+def initWorker(commits, index, ignored_files, ignored_revisions):
+	global _worker_closure
+	_worker_closure = CollisionClosure(commits, index, ignored_files, ignored_revisions)
+
+def runWorker(revisions):
+	return _worker_closure.run(revisions)
+
+def runClosure(arguments):
+	# one closure with its own commits and index, for a process pool running
+	# the closures of several pairs
+	commits, index, ignored_files, ignored_revisions, revisions = arguments
+	return CollisionClosure(commits, index, ignored_files, ignored_revisions).run(revisions)
+
+def indexCommits(commits, positions, trie):
+	# inverted index over the commits, all positions ascending:
+	# 'positions' revision -> position, 'revisions' position -> revision,
+	# 'paths' file id -> positions of the commits touching it, 'structural'
+	# file id -> positions of the commits adding, deleting or replacing it,
+	# 'tickets' task -> ticket id, 'ticket_positions' ticket id -> positions
+	# of the commits referencing it; 'below' structural file id -> the paths
+	# under it and 'above' file id -> the structural paths above it, only
+	# for the paths that have any. 'trie' relates the paths, it has to know
+	# every path of the commits
+	index = {}
+	index['positions'] = positions
+	index['revisions'] = array.array('l', [c.revision for c in commits])
+	index['paths'] = [None] * len(trie)
+	index['structural'] = [None] * len(trie)
+	index['tickets'] = {}
+	index['ticket_positions'] = []
+	index['below'] = {}
+	index['above'] = {}
+	index['trie'] = trie
+
+	for position, c in enumerate(commits):
+		for file_id, action in zip(c.files, c.actions):
+			file_positions = index['paths'][file_id]
+			if file_positions is None:
+				file_positions = index['paths'][file_id] = array.array('i')
+			file_positions.append(position)
+			if action in CommitModel.STRUCTURAL_ACTIONS:
+				file_positions = index['structural'][file_id]
+				if file_positions is None:
+					file_positions = index['structural'][file_id] = array.array('i')
+				file_positions.append(position)
+		ticket_id = index['tickets'].get(c.opnumber)
+		if ticket_id is None:
+			ticket_id = index['tickets'][c.opnumber] = len(index['ticket_positions'])
+			index['ticket_positions'].append(array.array('i'))
+		index['ticket_positions'][ticket_id].append(position)
+
+	# directories are few, their subtrees are related once here rather than
+	# for every node of every closure
+	for file_id, file_positions in enumerate(index['structural']):
+		if file_positions is None:
+			continue
+		below = [path_id for path_id in trie.descendants(file_id) if path_id < len(index['paths'])]
+		if len(below) <= 0:
+			continue
+		index['below'][file_id] = below
+		for path_id in below:
+			index['above'].setdefault(path_id, []).append(file_id)
+
+	return index
+
+
+class CollisionClosure:
+	# Collects every preceding commit a set of target revisions depends on.
+	# A commit collides when it shares a file with a target or with a commit
+	# that already collides, or when it references a task of a colliding
+	# commit and precedes one of the targets. Besides the same file, a
+	# commit shares a path with a node when it adds, deletes or replaces a
+	# directory above a file of the node, when the node does so to a
+	# directory above one of its files, or when the node copies a path the
+	# commit changed before the copied revision. The closure is the fixpoint
+	# of these rules, so it does not depend on the order it is explored in.
+	# Nodes are explored breadth first from an explicit worklist; depth is
+	# the number of hops from the nearest target.
+
+	def __init__(self, commits, index, ignored_files, ignored_revisions):
+		self.__commits = commits
+		self.__index = index
+		self.__ignored_files = ignored_files
+		self.__ignored_revisions = ignored_revisions
+
+	def run(self, revisions):
+		return list(self.collisions(revisions))
+
+	def collisions(self, revisions):
+		# yields the collision records in a deterministic order: level by
+		# level, and in commit order within the scan of a single node
+		commits = self.__commits
+		index = self.__index
+		ignored_files = self.__ignored_files
+
+		trie = index['trie']
+		path_count = len(index['paths'])
+		above = index['above']
+		below = index['below']
+		structural_actions = CommitModel.STRUCTURAL_ACTIONS
+
+		visited = CommitModel.Bitset(len(commits))
+		tickets = CommitModel.Bitset(len(index['ticket_positions']))
+		worklist = deque()
+		# file id -> position up to which its commits were already scanned;
+		# every earlier commit of the file is visited or ignored by then.
+		# Kept apart for all commits and the structural ones
+		scanned = array.array('i', [0]) * path_count
+		scanned_structural = array.array('i', [0]) * path_count
+
+		# the targets are scanned but never reported
+		limit = -1
+		for revision in revisions:
+			position = index['positions'].get(revision, -1)
+			if position < 0 or position in visited:
+				continue
+			visited.add(position)
+			worklist.append((position, 0))
+			limit = max(limit, position)
+
+		while worklist:
+			position, depth = worklist.popleft()
+			target_commit = commits[position]
+			target_commit_files = set([file_id for file_id in target_commit.files if not file_id in ignored_files])
+
+			# preceding commits touching one of the node's files, not yet scanned
+			candidates = set()
+			for file_id in target_commit_files:
+				if scanned[file_id] >= position:
+					continue
+				file_positions = index['paths'][file_id]
+				candidates.update(file_positions[
+					bisect.bisect_left(file_positions, scanned[file_id]):bisect.bisect_left(file_positions, position)
+				])
+				scanned[file_id] = position
+
+			# the paths related through directories and copies: what is above
+			# the node's files, below the directories it adds, deletes or
+			# replaces and the copy sources. candidate -> the paths it was found by
+			related = {}
+			def scanRelated(file_positions, kind_scanned, path_id, limit_position):
+				if path_id >= path_count or path_id in ignored_files or kind_scanned[path_id] >= limit_position:
+					return
+				if file_positions is not None:
+					for candidate in file_positions[
+						bisect.bisect_left(file_positions, kind_scanned[path_id]):bisect.bisect_left(file_positions, limit_position)
+					]:
+						related.setdefault(candidate, set()).add(path_id)
+				kind_scanned[path_id] = limit_position
+
+			if len(above) > 0:
+				for file_id in target_commit_files:
+					for ancestor_id in above.get(file_id, ()):
+						scanRelated(index['structural'][ancestor_id], scanned_structural, ancestor_id, position)
+					if file_id in below and target_commit.actions[bisect.bisect_left(target_commit.files, file_id)] in structural_actions:
+						for descendant_id in below[file_id]:
+							scanRelated(index['paths'][descendant_id], scanned, descendant_id, position)
+			for file_id, source_id, source_revision in target_commit.copies:
+				if file_id in ignored_files:
+					continue
+				source_position = min(position, bisect.bisect_right(index['revisions'], source_revision))
+				for path_id in [source_id] + list(trie.descendants(source_id)):
+					if path_id < path_count:
+						scanRelated(index['paths'][path_id], scanned, path_id, source_position)
+			candidates.update(related)
+
+			found = []
+			new_tickets = []
+			for candidate in sorted(candidates):
+				if candidate in visited or not self.__isCandidate(candidate):
+					continue
+				c = commits[candidate]
+				visited.add(candidate)
+				files = [file_id for file_id in c.files if file_id in target_commit_files]
+				if candidate in related:
+					files = sorted(related[candidate].union(files))
+				found.append((candidate, self.__collision(c, files, depth, target_commit.revision)))
+
+				ticket_id = index['tickets'][c.opnumber]
+				if not ticket_id in tickets:
+					tickets.add(ticket_id)
+					new_tickets.append(ticket_id)
+
+			# the commits of a newly colliding task that precede any target
+			for ticket_id in new_tickets:
+				ticket_positions = index['ticket_positions'][ticket_id]
+				for candidate in ticket_positions[:bisect.bisect_left(ticket_positions, limit)]:
+					if candidate in visited or not self.__isCandidate(candidate):
+						continue
+					c = commits[candidate]
+					visited.add(candidate)
+					found.append((candidate, self.__collision(c, [], depth, None)))
+
+			found.sort(key=lambda item: item[0])
+			for candidate, collision in found:
+				worklist.append((candidate, depth+1))
+				yield collision
+
+	def __isCandidate(self, position):
+		return not self.__commits[position].revision in self.__ignored_revisions
+
+	def __collision(self, c, files, depth, collides_with):
+		collision = {}
+		collision['revision'] = c.revision
+		collision['opnumber'] = c.opnumber
+		collision['files'] = files
+		collision['depth'] = depth
+		collision['filecollision'] = (len(files)>0)
+		collision['collideswith'] = collides_with
+		return collision
@@ -0,0 +1,175 @@
+import os, sqlite3, bisect
+import modules.CommitModel as CommitModel
+
+# set
+def create(cache_file):
+	return CommitCache(cache_file)
+
+def createMemory():
+	return MemoryCache()
+
+def missingRanges(fetched_ranges, start, end):
+	# the sub ranges of start..end not covered by the sorted fetched ranges
+	missing = []
+	next_revision = start
+	for fetched_start, fetched_end in fetched_ranges:
+		if fetched_end < next_revision:
+			continue
+		if fetched_start > end:
+			break
+		if fetched_start > next_revision:
+			missing.append((next_revision, fetched_start - 1))
+		next_revision = fetched_end + 1
+	if next_revision <= end:
+		missing.append((next_revision, end))
+	return missing
+
+def coalesceRange(fetched_ranges, start, end):
+	# start..end widened by the fetched ranges it touches or overlaps
+	for fetched_start, fetched_end in fetched_ranges:
+		if fetched_end+1 < start or fetched_start-1 > end:
+			continue
+		start = min(start, fetched_start)
+		end = max(end, fetched_end)
+	return start, end
+
+
+class CommitCache:
+	# bump whenever the stored commit layout changes, older caches are dropped
+	SCHEMA_VERSION = 3
+
+	def __init__(self, cache_file):
+		cache_folder = os.path.dirname(cache_file)
+		if len(cache_folder)>0 and not os.path.isdir(cache_folder):
+			os.makedirs(cache_folder)
+
+		self.__db = sqlite3.connect(cache_file)
+
+		version = self.__db.execute('PRAGMA user_version').fetchone()[0]
+		if version != self.SCHEMA_VERSION:
+			self.__db.execute('DROP TABLE IF EXISTS commits')
+			self.__db.execute('DROP TABLE IF EXISTS fetched')
+
+		self.__db.execute(
+			'CREATE TABLE IF NOT EXISTS commits ('
+			+ 'repo TEXT NOT NULL, revision INTEGER NOT NULL, user TEXT, timestamp TEXT, '
+			+ 'opnumber TEXT, files TEXT NOT NULL, PRIMARY KEY (repo, revision))'
+		)
+		# revision ranges of a repo url that were fetched completely, commits or not
+		self.__db.execute(
+			'CREATE TABLE IF NOT EXISTS fetched ('
+			+ 'repo TEXT NOT NULL, start INTEGER NOT NULL, end INTEGER NOT NULL)'
+		)
+		self.__db.execute('PRAGMA user_version = ' + str(self.SCHEMA_VERSION))
+		self.__db.commit()
+
+	def close(self):
+		self.__db.close()
+
+	def clear(self, repo):
+		with self.__db:
+			self.__db.execute('DELETE FROM commits WHERE repo = ?', (repo,))
+			self.__db.execute('DELETE FROM fetched WHERE repo = ?', (repo,))
+
+	def missingRanges(self, repo, start, end):
+		# the sub ranges of start..end that were never fetched for the repo
+		return missingRanges(self.__fetchedRanges(repo), start, end)
+
+	def store(self, repo, commits, paths, start, end):
+		# commits have to be the complete log of start..end, their files are
+		# stored as newline separated changes: the action and the path, and
+		# for a copy its source path and revision, separated by tabs
+		rows = []
+		for c in commits:
+			changes = []
+			for file_path, action, copy_path, copy_revision in c.changes(paths):
+				if copy_path is None:
+					changes.append(action + '\t' + file_path)
+				else:
+					changes.append(action + '\t' + file_path + '\t' + copy_path + '\t' + str(copy_revision))
+			rows.append((repo, c.revision, c.user, c.timestamp, c.opnumber, '\n'.join(changes)))
+
+		with self.__db:
+			self.__db.executemany('INSERT OR REPLACE INTO commits VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+			# coalesce the new range with the touching or overlapping ones
+			merged_start, merged_end = coalesceRange(self.__fetchedRanges(repo), start, end)
+			self.__db.execute(
+				'DELETE FROM fetched WHERE repo = ? AND start >= ? AND end <= ?',
+				(repo, merged_start, merged_end)
+			)
+			self.__db.execute('INSERT INTO fetched VALUES (?, ?, ?)', (repo, merged_start, merged_end))
+
+	def load(self, repo, start, end, paths, tickets = None):
+		commits = []
+		cursor = self.__db.execute(
+			'SELECT revision, user, timestamp, opnumber, files FROM commits '
+			+ 'WHERE repo = ? AND revision BETWEEN ? AND ? ORDER BY revision',
+			(repo, start, end)
+		)
+		for revision, user, timestamp, opnumber, files in cursor:
+			changes = []
+			for change in (files.split('\n') if len(files)>0 else []):
+				fields = change.split('\t')
+				if len(fields) > 2:
+					changes.append((fields[1], fields[0], fields[2], fields[3]))
+				else:
+					changes.append((fields[1], fields[0], None, None))
+			if tickets is not None:
+				tickets.add(opnumber, revision)
+			commits.append(CommitModel.Commit(revision, user, timestamp, opnumber, *paths.internChanges(changes)))
+		return commits
+
+	def __fetchedRanges(self, repo):
+		return self.__db.execute(
+			'SELECT start, end FROM fetched WHERE repo = ? ORDER BY start', (repo,)
+		).fetchall()
+
+
+class MemoryCache:
+	# The commits of a long running process, kept as parsed so a warm range
+	# costs no parsing at all. Same interface as CommitCache; the commits
+	# are recorded in the ticket index when they are parsed, not on load.
+
+	def __init__(self):
+		self.__repos = {}
+		# bumped on every change, tells derived state it is outdated
+		self.__version = 0
+
+	def version(self):
+		return self.__version
+
+	def close(self):
+		pass
+
+	def clear(self, repo):
+		self.__repos.pop(repo, None)
+		self.__version = self.__version + 1
+
+	def missingRanges(self, repo, start, end):
+		return missingRanges(self.__repo(repo)['fetched'], start, end)
+
+	def store(self, repo, commits, paths, start, end):
+		stored = self.__repo(repo)
+		by_revision = dict(zip(stored['revisions'], stored['commits']))
+		for c in commits:
+			by_revision[c.revision] = c
+		stored['revisions'] = sorted(by_revision)
+		stored['commits'] = [by_revision[revision] for revision in stored['revisions']]
+
+		merged_start, merged_end = coalesceRange(stored['fetched'], start, end)
+		fetched = [r for r in stored['fetched'] if r[0] < merged_start or r[1] > merged_end]
+		fetched.append((merged_start, merged_end))
+		stored['fetched'] = sorted(fetched)
+		self.__version = self.__version + 1
+
+	def load(self, repo, start, end, paths, tickets = None):
+		stored = self.__repo(repo)
+		revisions = stored['revisions']
+		return stored['commits'][bisect.bisect_left(revisions, start):bisect.bisect_right(revisions, end)]
+
+	def __repo(self, repo):
+		stored = self.__repos.get(repo)
+		if stored is None:
+			stored = self.__repos[repo] = {'revisions': [], 'commits': [], 'fetched': []}
+		return stored
@@ -0,0 +1,223 @@
+import sys, array, threading, re, fnmatch
+
+# compact in-memory representation of the svn log, every path string is kept
+# once in a PathTable and commits reference their files by integer id
+
+# actions changing everything below a path: a directory added (or copied),
+# deleted or replaced touches every path under it
+STRUCTURAL_ACTIONS = b'ADR'
+
+# characters making an ignore rule a glob
+GLOB_CHARACTERS = re.compile(r'[*?\[]')
+
+
+class PathTable:
+	__slots__ = ('__ids', '__paths', '__lock')
+
+	def __init__(self):
+		self.__ids = {}
+		self.__paths = []
+		# logs may be parsed on several threads at once
+		self.__lock = threading.Lock()
+
+	def __getstate__(self):
+		return self.__paths
+
+	def __setstate__(self, paths):
+		self.__paths = paths
+		self.__ids = dict([(path, path_id) for path_id, path in enumerate(paths)])
+		self.__lock = threading.Lock()
+
+	def __len__(self):
+		return len(self.__paths)
+
+	def intern(self, path):
+		path_id = self.__ids.get(path)
+		if path_id is None:
+			with self.__lock:
+				path_id = self.__ids.get(path)
+				if path_id is None:
+					path_id = len(self.__paths)
+					self.__paths.append(path)
+					self.__ids[path] = path_id
+		return path_id
+
+	def internFiles(self, file_paths):
+		# the sorted, duplicate free id array of a commit's files
+		return array.array('i', sorted(set([self.intern(file_path) for file_path in file_paths])))
+
+	def internChanges(self, changes):
+		# changes are (path, action letter, copy source path or None, copy
+		# source revision); returns the sorted file id array of the commit,
+		# the action of every file as one byte and the (file id, source id,
+		# source revision) of the copied files
+		by_id = {}
+		for change in changes:
+			by_id[self.intern(change[0])] = change
+		files = array.array('i', sorted(by_id))
+		actions = ''.join([by_id[file_id][1] for file_id in files]).encode('ascii')
+		copies = []
+		for file_id in files:
+			copy_path = by_id[file_id][2]
+			if copy_path:
+				copies.append((file_id, self.intern(copy_path), int(by_id[file_id][3])))
+		return files, actions, tuple(copies)
+
+	def find(self, path):
+		return self.__ids.get(path, -1)
+
+	def path(self, path_id):
+		return self.__paths[path_id]
+
+
+class PathTrie:
+	# The paths of a PathTable as a tree of their components, so the paths
+	# above and below a path are found by walking the tree instead of
+	# comparing it with every other path. Trie nodes are numbered, 0 is the
+	# root; a node is a path of the table or only a component on the way.
+	__slots__ = ('__children', '__parents', '__path_ids', '__nodes')
+
+	def __init__(self):
+		self.__children = [{}]
+		self.__parents = array.array('i', [-1])
+		# node -> path id or -1, path id -> node
+		self.__path_ids = array.array('i', [-1])
+		self.__nodes = array.array('i')
+
+	def __len__(self):
+		return len(self.__nodes)
+
+	def update(self, paths):
+		# adds the paths interned into the table since the last update
+		for path_id in range(len(self.__nodes), len(paths)):
+			node = self.__node(paths.path(path_id), True)
+			self.__path_ids[node] = path_id
+			self.__nodes.append(node)
+
+	def ancestors(self, path_id):
+		# the ids of the paths above a path, nearest first
+		path_ids = self.__path_ids
+		parents = self.__parents
+		node = parents[self.__nodes[path_id]]
+		while node >= 0:
+			if path_ids[node] >= 0:
+				yield path_ids[node]
+			node = parents[node]
+
+	def descendants(self, path_id):
+		# the ids of the paths below a path
+		return self.__below(self.__nodes[path_id])
+
+	def matching(self, paths, rule):
+		# the ids of the paths an ignore rule covers: a path ending with '/'
+		# covers everything below it, a glob the paths it matches, anything
+		# else the path itself
+		wildcard = GLOB_CHARACTERS.search(rule)
+		if wildcard is None and not rule.endswith('/'):
+			path_id = paths.find(rule)
+			return [path_id] if path_id >= 0 else []
+
+		# only the subtree above the first wildcard is searched
+		prefix = rule if wildcard is None else rule[:rule.rfind('/', 0, wildcard.start()) + 1]
+		node = self.__node(prefix)
+		if node < 0:
+			return []
+		matched = list(self.__below(node))
+		if self.__path_ids[node] >= 0:
+			matched.append(self.__path_ids[node])
+		if wildcard is None:
+			return matched
+		pattern = re.compile(fnmatch.translate(rule))
+		return [path_id for path_id in matched if pattern.match(paths.path(path_id))]
+
+	def __below(self, node):
+		path_ids = self.__path_ids
+		pending = list(self.__children[node].values())
+		while pending:
+			node = pending.pop()
+			if path_ids[node] >= 0:
+				yield path_ids[node]
+			pending.extend(self.__children[node].values())
+
+	def __node(self, path, create = False):
+		node = 0
+		for component in path.split('/'):
+			if len(component) <= 0:
+				continue
+			child = self.__children[node].get(component)
+			if child is None:
+				if not create:
+					return -1
+				child = len(self.__children)
+				self.__children[node][component] = child
+				self.__children.append({})
+				self.__parents.append(node)
+				self.__path_ids.append(-1)
+			node = child
+		return node
+
+
+class TicketIndex:
+	# task -> revisions of the commits referencing it, filled while the log is
+	# parsed; a revision parsed twice, e.g. fetched and then loaded from the
+	# cache, is listed once
+	__slots__ = ('__revisions', '__lock')
+
+	def __init__(self):
+		self.__revisions = {}
+		# logs may be parsed on several threads at once
+		self.__lock = threading.Lock()
+
+	def __len__(self):
+		return len(self.__revisions)
+
+	def add(self, opnumber, revision):
+		with self.__lock:
+			revisions = self.__revisions.get(opnumber)
+			if revisions is None:
+				revisions = self.__revisions[opnumber] = set()
+			revisions.add(revision)
+
+	def revisions(self, opnumber):
+		return sorted(self.__revisions.get(opnumber, ()))
+
+
+class Commit:
+	# files are sorted path ids, actions holds the action of every file as
+	# one byte and copies the (file id, source id, source revision) of the
+	# files copied from elsewhere
+	__slots__ = ('revision', 'user', 'timestamp', 'opnumber', 'files', 'actions', 'copies')
+
+	def __init__(self, revision, user, timestamp, opnumber, files, actions = None, copies = ()):
+		self.revision = revision
+		self.user = sys.intern(user)
+		self.timestamp = timestamp
+		self.opnumber = sys.intern(opnumber)
+		self.files = files
+		self.actions = actions if actions is not None else b'M' * len(files)
+		self.copies = copies
+
+	def changes(self, paths):
+		# the changes as PathTable.internChanges takes them
+		copies = dict([(file_id, (source_id, source_revision)) for file_id, source_id, source_revision in self.copies])
+		changes = []
+		for file_id, action in zip(self.files, self.actions):
+			copy = copies.get(file_id)
+			if copy is None:
+				changes.append((paths.path(file_id), chr(action), None, None))
+			else:
+				changes.append((paths.path(file_id), chr(action), paths.path(copy[0]), copy[1]))
+		return changes
+
+
+class Bitset:
+	__slots__ = ('__bits',)
+
+	def __init__(self, size):
+		self.__bits = bytearray((size >> 3) + 1)
+
+	def add(self, position):
+		self.__bits[position >> 3] |= 1 << (position & 7)
+
+	def __contains__(self, position):
+		return (self.__bits[position >> 3] >> (position & 7)) & 1 == 1
@@ -0,0 +1,102 @@
+import os, sys, errno, signal, socket, socketserver
+import modules.SocketFrames as SocketFrames
+
+# a pool of pre-forked processes validating commits for the hook client, so
+# a commit costs a socket round trip instead of an interpreter start. The
+# parent binds the unix socket and forks the workers, which accept on it
+# side by side with the validation already imported; a worker that dies is
+# forked again. SIGTERM or SIGINT stops the pool.
+#
+# protocol, the json lines of SocketFrames: the client sends
+# {"arguments": [...], "cwd": path}, the hook arguments and the directory
+# a relative repository path is one of. {"ping": true} is answered with
+# {"exit": 0}
+
+# where the pool listens unless told otherwise, the client falls back to
+# validating in process when nothing listens there
+SOCKET_PATH = '/tmp/svn_check_log_message.sock'
+
+# set
+def create(socket_path, workers, validate):
+	# validate takes the hook arguments and the directory of the client,
+	# which may be None, and returns the exit code. The arguments come from
+	# whoever can reach the socket, validate accepts the hook ones only
+	return HookWorker(socket_path, workers, validate)
+
+def listening(socket_path):
+	# whether a pool accepts connections on the socket
+	connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		connection.connect(socket_path)
+		return True
+	except OSError:
+		return False
+	finally:
+		connection.close()
+
+
+class HookWorker:
+	def __init__(self, socket_path, workers, validate):
+		self.__socket_path = socket_path
+		self.__workers = max(workers, 1)
+		self.__validate = validate
+
+	def serve(self):
+		if listening(self.__socket_path):
+			sys.stderr.write('A hook worker is already listening on [' + self.__socket_path + ']\n')
+			return 1
+		if os.path.exists(self.__socket_path):
+			os.remove(self.__socket_path)
+
+		server = socketserver.UnixStreamServer(self.__socket_path, SocketFrames.handler(self.__handle))
+		children = set()
+
+		def stop(signum, frame):
+			raise SystemExit(0)
+		signal.signal(signal.SIGTERM, stop)
+		signal.signal(signal.SIGINT, stop)
+
+		sys.stderr.write('Validating commits with [' + str(self.__workers) + '] workers on [' + self.__socket_path + ']\n')
+		try:
+			for worker in range(self.__workers):
+				children.add(self.__fork(server))
+			while True:
+				try:
+					pid, status = os.wait()
+				except OSError as e:
+					if e.errno != errno.ECHILD:
+						raise
+					return 1
+				if pid in children:
+					children.remove(pid)
+					children.add(self.__fork(server))
+		except SystemExit:
+			return 0
+		finally:
+			for pid in children:
+				try:
+					os.kill(pid, signal.SIGTERM)
+				except OSError:
+					pass
+			server.server_close()
+			if os.path.exists(self.__socket_path):
+				os.remove(self.__socket_path)
+
+	def __fork(self, server):
+		pid = os.fork()
+		if pid != 0:
+			return pid
+		# the worker: accepts until it is terminated, never returns
+		signal.signal(signal.SIGTERM, signal.SIG_DFL)
+		signal.signal(signal.SIGINT, signal.SIG_IGN)
+		try:
+			server.serve_forever()
+		finally:
+			os._exit(0)
+
+	def __handle(self, message, send):
+		if not 'arguments' in message:
+			send({'exit': 0})
+			return
+
+		SocketFrames.answer(send, lambda: self.__validate(message['arguments'], message.get('cwd')), '[ERROR] The commit check failed: %s')
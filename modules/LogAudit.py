@@ -0,0 +1,145 @@
+import os, io, json, contextlib
+from concurrent.futures import ProcessPoolExecutor
+import modules.CommitModel as CommitModel
+import modules.SvnBackend as SvnBackend
+import modules.TicketRegistry as TicketRegistry
+
+# audits the history against the log message rules. The range is split into
+# chunks, each read with a single svn log call carrying the messages and the
+# changed paths together, and the chunks are checked on a pool of processes.
+# The violations are written as ndjson records in revision order; a
+# checkpoint beside the output records how far the output is complete, a
+# stopped audit resumes there. A checkpoint of other settings, another
+# repository, start or rules, is discarded and the audit starts over; a
+# later end continues the audit.
+
+# set
+def create(backend_name, repository, validate, registry_path):
+	# validate takes a look command, the log message and the registry and
+	# returns the error of the commit or None
+	return LogAudit(backend_name, repository, validate, registry_path)
+
+# the audit of a pool process, set up once by initWorker
+_worker_audit = None
+
+def initWorker(backend_name, repository, validate, registry_path):
+	global _worker_audit
+	_worker_audit = LogAudit(backend_name, repository, validate, registry_path)
+
+def runWorker(chunk):
+	return _worker_audit.auditChunk(*chunk)
+
+def checkpointPath(output_path):
+	return output_path + '.checkpoint'
+
+
+class LogAudit:
+	def __init__(self, backend_name, repository, validate, registry_path):
+		self.__backend_name = backend_name
+		self.__backend = SvnBackend.create(backend_name)
+		self.__repository = repository
+		self.__validate = validate
+		self.__registry_path = registry_path
+		self.__registry = TicketRegistry.create(registry_path) if registry_path is not None else None
+		self.__paths = CommitModel.PathTable()
+
+	def run(self, start, end, output_path, settings, jobs, chunk_size):
+		if self.__registry is not None:
+			# a broken snapshot fails the audit, not every commit of it
+			len(self.__registry)
+
+		checkpoint_file = checkpointPath(output_path)
+		checkpoint = self.__loadCheckpoint(checkpoint_file, settings)
+		if checkpoint is None:
+			checkpoint = {'settings': settings, 'next': start, 'output_size': 0, 'audited': 0, 'violations': 0}
+		else:
+			print('Resuming the audit at [' + str(checkpoint['next']) + ']')
+
+		# what a crash wrote after the checkpoint is written again
+		with open(output_path, 'a') as output:
+			output.truncate(checkpoint['output_size'])
+
+		chunks = []
+		for chunk_start in range(checkpoint['next'], end+1, chunk_size):
+			chunks.append((chunk_start, min(chunk_start + chunk_size - 1, end)))
+
+		executor = None
+		if jobs > 1 and len(chunks) > 1:
+			executor = ProcessPoolExecutor(
+				max_workers=jobs,
+				initializer=initWorker,
+				initargs=(self.__backend_name, self.__repository, self.__validate, self.__registry_path)
+			)
+			results = executor.map(runWorker, chunks)
+		else:
+			results = map(lambda chunk: self.auditChunk(*chunk), chunks)
+
+		try:
+			with open(output_path, 'a') as output:
+				for (chunk_start, chunk_end), (audited, violations) in zip(chunks, results):
+					for violation in violations:
+						output.write(json.dumps(violation) + '\n')
+					output.flush()
+					os.fsync(output.fileno())
+					checkpoint['next'] = chunk_end + 1
+					checkpoint['output_size'] = output.tell()
+					checkpoint['audited'] += audited
+					checkpoint['violations'] += len(violations)
+					self.__saveCheckpoint(checkpoint_file, checkpoint)
+					print('Audited [' + str(chunk_start) + ':' + str(chunk_end) + '], [' + str(len(violations)) + '] violations')
+		finally:
+			if executor is not None:
+				executor.shutdown(wait=True, cancel_futures=True)
+
+		print('Audited [' + str(checkpoint['audited']) + '] revisions, [' + str(checkpoint['violations']) + '] violations')
+		return 0 if checkpoint['violations'] <= 0 else 1
+
+	def auditChunk(self, start, end):
+		# the number of commits of start..end and their violation records
+		messages = {}
+		commits = list(self.__backend.log(self.__repository, str(start) + ':' + str(end), self.__paths, 'xml', None, messages))
+		commits.sort(key=lambda c: c.revision)
+
+		violations = []
+		# the checks report passthroughs, nobody reads them here
+		with contextlib.redirect_stdout(io.StringIO()):
+			for c in commits:
+				message = messages.get(c.revision, '')
+				error = self.__validate(self.__lookCmd(c, message), message, self.__registry)
+				if error is not None:
+					violations.append({
+						'revision': c.revision,
+						'author': c.user,
+						'date': c.timestamp,
+						'message': message.strip().split('\n', 1)[0],
+						'error': error
+					})
+		return len(commits), violations
+
+	def __lookCmd(self, c, message):
+		# answers the checks from the log entry the way svnlook would, the
+		# changed paths sorted
+		paths = self.__paths
+		def look_cmd(subcommand, lines=False):
+			if subcommand == 'log':
+				output = [(message + '\n').encode('utf-8')]
+			else:
+				output = [(change[1] + '   ' + change[0].lstrip('/') + '\n').encode('utf-8') for change in sorted(c.changes(paths))]
+			return iter(output) if lines else b''.join(output)
+		return look_cmd
+
+	def __loadCheckpoint(self, checkpoint_file, settings):
+		if not os.path.isfile(checkpoint_file):
+			return None
+		with open(checkpoint_file, 'r') as fin:
+			checkpoint = json.load(fin)
+		if checkpoint.get('settings') != settings:
+			print('The checkpoint is of other settings, the audit starts over')
+			return None
+		return checkpoint
+
+	def __saveCheckpoint(self, checkpoint_file, checkpoint):
+		# written aside and renamed, a crash never leaves half a checkpoint
+		with open(checkpoint_file + '.tmp', 'w') as fout:
+			json.dump(checkpoint, fout)
+		os.replace(checkpoint_file + '.tmp', checkpoint_file)
@@ -0,0 +1,103 @@
+import os, sys, socketserver, threading
+import modules.SocketFrames as SocketFrames
+
+# a long running merge analysis behind a unix socket. The daemon keeps the
+# parsed log, the path and ticket indexes and the mergeinfo of a
+# MergeRevision warm, refreshes them by polling for new revisions or when
+# notified, and runs the queries of thin clients against them.
+#
+# protocol, the json lines of SocketFrames: the client sends
+# {"arguments": [...]} for a query, {"notify": true} after a commit or
+# {"stop": true}
+
+# options whose value is a local file, made absolute before they are sent
+PATH_OPTIONS = ('--output', '--timings', '--profile', '--batch')
+
+# set
+def create(merge, socket_path, poll_seconds):
+	return MergeDaemon(merge, socket_path, poll_seconds)
+
+def request(socket_path, message, stdout = None, stderr = None):
+	# sends a message to the daemon and relays its answer, returns the exit
+	# code or None when no daemon answered and the query runs in process
+	return SocketFrames.request(socket_path, message, stdout, stderr, 'The daemon stopped unexpectedly\n')
+
+def absoluteArguments(arguments):
+	# the daemon runs elsewhere, relative file arguments are resolved here
+	absolute = []
+	for argument in arguments:
+		option, separator, value = argument.partition('=')
+		if len(separator)>0 and len(value)>0 and value != '-':
+			if option in PATH_OPTIONS:
+				argument = option + '=' + os.path.abspath(value)
+			elif option == '--backend' and value.startswith('replay:'):
+				argument = option + '=replay:' + os.path.abspath(value[len('replay:'):])
+		absolute.append(argument)
+	return absolute
+
+
+class MergeDaemon:
+	def __init__(self, merge, socket_path, poll_seconds):
+		self.__merge = merge
+		self.__socket_path = socket_path
+		self.__poll_seconds = poll_seconds
+		# queries and refreshes share the warm state, they run one at a time
+		self.__lock = threading.Lock()
+		self.__stopped = threading.Event()
+		self.__server = None
+
+	def serve(self, arguments):
+		# warms up with the range of the arguments and serves until stopped
+		with open(os.devnull, 'w') as devnull:
+			running = request(self.__socket_path, {'ping': True}, devnull, devnull) is not None
+		if running:
+			sys.stderr.write('A daemon is already listening on [' + self.__socket_path + ']\n')
+			return 1
+		if os.path.exists(self.__socket_path):
+			os.remove(self.__socket_path)
+
+		self.__arguments = arguments
+		self.__merge.refresh(arguments)
+
+		self.__server = socketserver.UnixStreamServer(self.__socket_path, SocketFrames.handler(self.__handle))
+		if self.__poll_seconds > 0:
+			poller = threading.Thread(target=self.__poll)
+			poller.daemon = True
+			poller.start()
+
+		sys.stderr.write('Serving merge queries on [' + self.__socket_path + ']\n')
+		try:
+			self.__server.serve_forever()
+		finally:
+			self.__stopped.set()
+			self.__server.server_close()
+			if os.path.exists(self.__socket_path):
+				os.remove(self.__socket_path)
+		return 0
+
+	def __poll(self):
+		while not self.__stopped.wait(self.__poll_seconds):
+			self.__refresh()
+
+	def __refresh(self):
+		with self.__lock:
+			try:
+				self.__merge.refresh(self.__arguments)
+			except Exception as e:
+				sys.stderr.write('Refreshing the log failed: ' + str(e) + '\n')
+
+	def __handle(self, message, send):
+		if 'notify' in message:
+			self.__refresh()
+			send({'exit': 0})
+			return
+		if 'stop' in message:
+			send({'exit': 0})
+			threading.Thread(target=self.__server.shutdown).start()
+			return
+		if not 'arguments' in message:
+			send({'exit': 0})
+			return
+
+		with self.__lock:
+			SocketFrames.answer(send, lambda: self.__merge.run(message['arguments']), 'The query failed: %s\n')
@@ -0,0 +1,106 @@
+import os, json
+
+# the svn merge calls bringing a set of revisions over, in revision order.
+# A run of revisions with no other unmerged commit in between becomes one
+# -r range; the revisions in between runs are listed in -c calls. The plan
+# doubles as the checkpoint of its execution: it records the next step and
+# is saved after every step, so an interrupted merge can be resumed
+
+# runs shorter than this are listed in -c calls
+MIN_RANGE = 3
+# revisions per -c call, keeps the command line short
+MAX_CHANGES = 50
+
+# set
+def create(revisions, positions, source, target):
+	return MergePlan(planSteps(revisions, positions), source, target)
+
+def load(checkpoint_file):
+	# the plan of an interrupted merge, None when there is none
+	if not os.path.isfile(checkpoint_file):
+		return None
+	with open(checkpoint_file, 'r') as fin:
+		checkpoint = json.load(fin)
+	return MergePlan(checkpoint['steps'], checkpoint['source'], checkpoint['target'], checkpoint['next'])
+
+def planSteps(revisions, positions):
+	# positions maps every unmerged revision to its position in the unmerged
+	# commits, neighbouring positions can share a range
+	runs = []
+	for revision in sorted(set([r for r in revisions if r in positions])):
+		if len(runs)>0 and positions[revision] == positions[runs[-1][-1]] + 1:
+			runs[-1].append(revision)
+		else:
+			runs.append([revision])
+
+	steps = []
+	for run in runs:
+		if len(run) >= MIN_RANGE:
+			steps.append({'kind': 'range', 'revisions': run})
+			continue
+		for revision in run:
+			if len(steps)>0 and steps[-1]['kind'] == 'change' and len(steps[-1]['revisions']) < MAX_CHANGES:
+				steps[-1]['revisions'].append(revision)
+			else:
+				steps.append({'kind': 'change', 'revisions': [revision]})
+	return steps
+
+def stepRanges(step):
+	# the step as svn -r start:end ranges, start exclusive
+	revisions = step['revisions']
+	if step['kind'] == 'range':
+		return [(revisions[0]-1, revisions[-1])]
+	return [(revision-1, revision) for revision in revisions]
+
+def stepArguments(step):
+	revisions = step['revisions']
+	if step['kind'] == 'range':
+		return ['-r', str(revisions[0]-1) + ':' + str(revisions[-1])]
+	return ['-c', ','.join([str(revision) for revision in revisions])]
+
+
+class MergePlan:
+	def __init__(self, steps, source, target, next_step = 0):
+		self.__steps = steps
+		self.__source = source
+		self.__target = target
+		self.__next_step = next_step
+
+	def steps(self):
+		return self.__steps
+
+	def source(self):
+		return self.__source
+
+	def target(self):
+		return self.__target
+
+	def nextStep(self):
+		return self.__next_step
+
+	def advance(self):
+		self.__next_step = self.__next_step + 1
+
+	def done(self):
+		return self.__next_step >= len(self.__steps)
+
+	def revisions(self):
+		return [revision for step in self.__steps for revision in step['revisions']]
+
+	def command(self, step):
+		return ' '.join(['svn', 'merge'] + stepArguments(step) + [self.__source, self.__target])
+
+	def record(self):
+		# the plan as written to json reports and checkpoints
+		record = {}
+		record['source'] = self.__source
+		record['target'] = self.__target
+		record['next'] = self.__next_step
+		record['steps'] = self.__steps
+		return record
+
+	def save(self, checkpoint_file):
+		# written aside and renamed, a crash never leaves half a checkpoint
+		with open(checkpoint_file + '.tmp', 'w') as fout:
+			json.dump(self.record(), fout)
+		os.replace(checkpoint_file + '.tmp', checkpoint_file)
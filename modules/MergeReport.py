@@ -0,0 +1,392 @@
+import json
+
+# report writers of a merge analysis: the analysis hands over its outcome
+# piece by piece (start, every collision as the closure finds it, the merge
+# plan, finish, every executed merge step) and the writer renders it as
+# text, one json document or ndjson records. The reports of several source
+# and target pairs are written through a report group
+
+FORMATS = ('text', 'json', 'ndjson')
+
+SEPARATOR = '---------------------------------------------------------------'
+DIVIDER = '~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~'
+
+# set
+def create(output_format, output, paths, show_colliding_files, pair = None):
+	if output_format == 'json':
+		return JsonReport(output, paths, show_colliding_files, pair)
+	if output_format == 'ndjson':
+		return NdjsonReport(output, paths, show_colliding_files, pair)
+	return TextReport(output, paths, show_colliding_files, pair)
+
+def createGroup(output_format, output, paths, show_colliding_files):
+	return ReportGroup(output_format, output, paths, show_colliding_files)
+
+def groupByTask(collisions):
+	# task -> its collisions sorted by revision, tasks in order of appearance
+	collisions_by_op_number = {}
+	for co in collisions:
+		op_number = co['opnumber']
+		if not (op_number in collisions_by_op_number):
+			collisions_by_op_number[op_number] = []
+		collisions_by_op_number[op_number].append(co);
+
+	for op_number in collisions_by_op_number:
+		collisions_by_op_number[op_number] = sorted(
+			collisions_by_op_number[op_number],
+			key=lambda co: co['revision']
+		)
+	return collisions_by_op_number
+
+def oneLiner(label, collisions_by_op_number):
+	tasks = []
+	for op_number in collisions_by_op_number:
+		task_revisions = [co['revision'] for co in collisions_by_op_number[op_number]]
+		tasks.append(revisionsAsString(task_revisions, '/') + '(' + op_number + ')')
+	return label + ' - ' + ', '.join(tasks)
+
+def collisionRecord(co, paths, show_colliding_files):
+	# a collision with its file ids resolved, as written to json
+	record = {}
+	record['revision'] = co['revision']
+	record['opnumber'] = co['opnumber']
+	record['depth'] = co['depth']
+	record['filecollision'] = co['filecollision']
+	record['collideswith'] = co['collideswith']
+	if show_colliding_files:
+		record['files'] = sorted([paths.path(file_id) for file_id in co['files']])
+	return record
+
+def revisionsAsString(revisions, separator):
+	return separator.join(map(lambda x: str(x), revisions))
+
+def autoRangeLine(summary):
+	# what an inferred range fetched, compared with the range it replaces
+	return (
+		'Auto range: fetching ['+str(summary['fetched_revisions'])+'] of the ['
+		+ str(summary['requested_revisions'])+'] revisions of ['+summary['requested_range']+'] in ['
+		+ str(summary['gaps'])+'] ranges, ['+str(summary['skipped_revisions'])+'] merged revisions skipped, ['
+		+ str(summary['past_target_revisions'])+'] revisions past the highest target skipped'
+	)
+
+
+class Report:
+	# The outcome of one analysis. notice() ends an analysis that did not
+	# get to the closure; otherwise start(), collision() for every record,
+	# plan() when a merge plan was asked for and finish() follow each other.
+	# mergeStep() reports the steps of an executed plan and close() ends
+	# the report. Statuses are the ones of batch mode: collides, clean,
+	# not_in_range, plus no_revisions, no_mergeinfo and no_merges when the
+	# log or the mergeinfo leave nothing to analyse. A report of a pair
+	# names its source and target. autoRange() comes first when the range
+	# was inferred from the mergeinfo.
+
+	def __init__(self, output, paths, show_colliding_files, pair = None):
+		self._output = output
+		self._pair = pair
+		self._paths = paths
+		self._show_colliding_files = show_colliding_files
+		self._collisions = []
+		self._revisions = []
+		self._checked_revisions = []
+		self._is_single_revision = True
+		self._plan = None
+		self._auto_range = None
+
+	def autoRange(self, summary):
+		# summary: range, gaps, requested_range, requested_revisions,
+		# fetched_revisions, skipped_revisions, the merged ones, and
+		# past_target_revisions
+		self._auto_range = summary
+
+	def notice(self, status, message):
+		pass
+
+	def start(self, revisions, checked_revisions, is_single_revision, commit_count):
+		self._revisions = revisions
+		self._checked_revisions = checked_revisions
+		self._is_single_revision = is_single_revision
+
+	def collision(self, co):
+		self._collisions.append(co)
+
+	def plan(self, plan):
+		self._plan = plan
+
+	def finish(self):
+		pass
+
+	def mergeStep(self, event):
+		# event: step, steps, command, revisions, status (merged, conflict or
+		# failed) and the conflicts or the failure message
+		pass
+
+	def close(self):
+		pass
+
+	def collisions(self):
+		return self._collisions
+
+	def _label(self):
+		if self._is_single_revision:
+			return str(self._revisions[0])
+		return revisionsAsString(self._checked_revisions, '/')
+
+	def _status(self):
+		return 'collides' if len(self._collisions)>0 else 'clean'
+
+	def _planRecord(self):
+		record = self._plan.record()
+		record['commands'] = [self._plan.command(step) for step in self._plan.steps()]
+		return record
+
+
+class TextReport(Report):
+	# the human readable report, rendered into one buffer and written at once
+
+	def __init__(self, output, paths, show_colliding_files, pair = None):
+		Report.__init__(self, output, paths, show_colliding_files, pair)
+		self.__header_written = False
+
+	def autoRange(self, summary):
+		Report.autoRange(self, summary)
+		self.__header()
+		self._output.write(autoRangeLine(summary) + '\n')
+
+	def notice(self, status, message):
+		self.__header()
+		self._output.write(message + '\n')
+
+	def start(self, revisions, checked_revisions, is_single_revision, commit_count):
+		Report.start(self, revisions, checked_revisions, is_single_revision, commit_count)
+		self.__header()
+		self._output.write(SEPARATOR + '\n')
+		self._output.write('There are ['+str(commit_count)+'] commits to be merged.\n')
+		self._output.write('\n')
+		self._output.flush()
+
+	def finish(self):
+		lines = []
+		all_collisions = self._collisions
+		collisions_by_op_number = groupByTask(all_collisions)
+
+		if collisions_by_op_number:
+			if self._is_single_revision:
+				lines.append('Revision ['+str(self._revisions[0])+'] collides with the following commits:')
+			else:
+				lines.append(
+					'Provided revisions ['
+					+ revisionsAsString(self._checked_revisions, ', ')
+					+'] collide with the following commits:'
+				)
+			for op_number in collisions_by_op_number:
+				lines.append(' * Task ['+op_number+'] collisions:')
+				for co in collisions_by_op_number[op_number]:
+					lines.append('   * Revision: ['+str(co['revision'])+']')
+				lines.append('')
+			lines.append(DIVIDER)
+			lines.append('One liner: '+oneLiner(self._label(), collisions_by_op_number))
+			lines.append(DIVIDER)
+
+			if self._show_colliding_files:
+				lines.append(DIVIDER)
+				lines.append('Detailed report listing colliding files follows:')
+				lines.append(DIVIDER)
+				for co in all_collisions:
+					lines.append(DIVIDER)
+					if not co['filecollision']:
+						lines.append(
+							'Revision ['
+							+ str(co['revision'])
+							+ '] has no colliding files but references Task ['
+							+ co['opnumber']
+							+ ']'
+						)
+					else:
+						file_collision_reason = ' directly with revision ['+str(co['collideswith'])+']'
+						if co['depth']!=0:
+							file_collision_reason = ' indirectly via revision ['+str(co['collideswith'])+']'
+						lines.append(
+							'Revision: ['
+							+ str(co['revision'])
+							+ '] for task: ['
+							+ co['opnumber']
+							+ '] collides'
+							+ file_collision_reason
+						)
+						lines.append('Files:')
+						for file_path in sorted([self._paths.path(file_id) for file_id in co['files']]):
+							lines.append('>> ' + file_path)
+					lines.append(DIVIDER)
+					lines.append('')
+		else:
+			lines.append('No collisions detected, merge can be performed')
+
+		if self._plan is not None:
+			lines.append(DIVIDER)
+			lines.append(
+				'Merge plan: ['+str(len(self._plan.revisions()))+'] revisions in ['
+				+ str(len(self._plan.steps()))+'] svn merge calls:'
+			)
+			for step in self._plan.steps():
+				lines.append(' * ' + self._plan.command(step))
+			lines.append(DIVIDER)
+
+		lines.append(SEPARATOR)
+		lines.append('Done.')
+		self._output.write('\n'.join(lines) + '\n')
+		self._output.flush()
+
+	def mergeStep(self, event):
+		lines = ['Merge step ['+str(event['step'])+'/'+str(event['steps'])+'] '+event['status']+': '+event['command']]
+		if event['status'] == 'conflict':
+			for file_path in event['conflicts']:
+				lines.append('>> ' + file_path)
+		if event['status'] == 'failed':
+			lines.append(event['message'])
+		if event['status'] != 'merged':
+			lines.append('Resolve the working copy and continue with --resume')
+		self._output.write('\n'.join(lines) + '\n')
+		self._output.flush()
+
+	def __header(self):
+		if self._pair is not None and not self.__header_written:
+			self.__header_written = True
+			self._output.write(SEPARATOR + '\n')
+			self._output.write('Merging ['+self._pair['source']+'] into ['+self._pair['target']+']\n')
+
+
+class JsonReport(Report):
+	# the whole analysis as a single json document, written on close so it
+	# includes the steps of an executed merge
+
+	def __init__(self, output, paths, show_colliding_files, pair = None):
+		Report.__init__(self, output, paths, show_colliding_files, pair)
+		self.__document = None
+		self.__merge_steps = []
+
+	def notice(self, status, message):
+		self.__document = {'status': status, 'message': message}
+
+	def start(self, revisions, checked_revisions, is_single_revision, commit_count):
+		Report.start(self, revisions, checked_revisions, is_single_revision, commit_count)
+		self.__commit_count = commit_count
+
+	def finish(self):
+		document = {}
+		document['status'] = self._status()
+		document['revisions'] = self._revisions
+		document['checked_revisions'] = self._checked_revisions
+		document['commits'] = self.__commit_count
+		document['collisions'] = [collisionRecord(co, self._paths, self._show_colliding_files) for co in self._collisions]
+		if len(self._collisions)>0:
+			document['oneliner'] = oneLiner(self._label(), groupByTask(self._collisions))
+		if self._plan is not None:
+			document['plan'] = self._planRecord()
+		self.__document = document
+
+	def mergeStep(self, event):
+		self.__merge_steps.append(event)
+
+	def close(self):
+		document = self.document()
+		if document is None:
+			return
+		self._output.write(json.dumps(document) + '\n')
+		self._output.flush()
+
+	def document(self):
+		# the document as written on close, None when there is nothing to write
+		document = self.__document
+		if document is None and len(self.__merge_steps) <= 0:
+			return None
+		if document is None:
+			document = {}
+		if self._pair is not None:
+			document['source'] = self._pair['source']
+			document['target'] = self._pair['target']
+		if self._auto_range is not None:
+			document['auto_range'] = self._auto_range
+		if len(self.__merge_steps)>0:
+			document['merge'] = self.__merge_steps
+		return document
+
+
+class NdjsonReport(Report):
+	# one json record per line, each collision flushed as soon as the closure
+	# yields it; the last record carries the status and the one liner
+
+	def autoRange(self, summary):
+		Report.autoRange(self, summary)
+		record = {'type': 'range'}
+		record.update(summary)
+		self.__write(record)
+
+	def notice(self, status, message):
+		self.__write({'type': 'result', 'status': status, 'message': message})
+
+	def start(self, revisions, checked_revisions, is_single_revision, commit_count):
+		Report.start(self, revisions, checked_revisions, is_single_revision, commit_count)
+		self.__write({
+			'type': 'start',
+			'revisions': revisions,
+			'checked_revisions': checked_revisions,
+			'commits': commit_count
+		})
+
+	def collision(self, co):
+		Report.collision(self, co)
+		record = {'type': 'collision'}
+		record.update(collisionRecord(co, self._paths, self._show_colliding_files))
+		self.__write(record)
+
+	def plan(self, plan):
+		Report.plan(self, plan)
+		record = {'type': 'plan'}
+		record.update(self._planRecord())
+		self.__write(record)
+
+	def mergeStep(self, event):
+		record = {'type': 'merge'}
+		record.update(event)
+		self.__write(record)
+
+	def finish(self):
+		record = {'type': 'result', 'status': self._status(), 'collisions': len(self._collisions)}
+		if len(self._collisions)>0:
+			record['oneliner'] = oneLiner(self._label(), groupByTask(self._collisions))
+		self.__write(record)
+
+	def __write(self, record):
+		if self._pair is not None:
+			record['source'] = self._pair['source']
+			record['target'] = self._pair['target']
+		self._output.write(json.dumps(record) + '\n')
+		self._output.flush()
+
+
+class ReportGroup:
+	# the reports of several source and target pairs in one output: text and
+	# ndjson reports follow each other, the json documents are written on
+	# close as one list
+
+	def __init__(self, output_format, output, paths, show_colliding_files):
+		self.__output_format = output_format
+		self.__output = output
+		self.__paths = paths
+		self.__show_colliding_files = show_colliding_files
+		self.__reports = []
+
+	def report(self, pair):
+		report = create(self.__output_format, self.__output, self.__paths, self.__show_colliding_files, pair)
+		self.__reports.append(report)
+		return report
+
+	def close(self):
+		if self.__output_format != 'json':
+			for report in self.__reports:
+				report.close()
+			return
+		documents = [report.document() for report in self.__reports]
+		self.__output.write(json.dumps([document for document in documents if document is not None]) + '\n')
+		self.__output.flush()
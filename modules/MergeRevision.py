@@ -1,4 +1,15 @@
-import sys, getopt, subprocess, re
+import sys, os, getopt, time, json, cProfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import modules.CommitCache as CommitCache
+import modules.CommitModel as CommitModel
+import modules.CollisionClosure as CollisionClosure
+import modules.SvnLog as SvnLog
+import modules.PhaseTimer as PhaseTimer
+import modules.MergeReport as MergeReport
+import modules.SvnBackend as SvnBackend
+import modules.MergePlan as MergePlan
+import modules.MergeDaemon as MergeDaemon
+import modules.ClosureState as ClosureState
 
 # set
 def create(config):
@@ -19,476 +30,993 @@ class MergeRevision:
 
 		self.__CONST['svn_location'] = config["svn_location"]
 
+		# source path -> target working copy pairs analysed together, the
+		# trunk into the local working copy unless the config lists them
+		self.__CONST['merge_pairs'] = config["merge_pairs"] if "merge_pairs" in config else [
+			{'source': config["svn_env"]['trunk'], 'target': config["svn_location"]['local']}
+		]
+
+		# every file path seen in the log, commits reference them by id
+		self.__paths = CommitModel.PathTable()
+		# the same paths as a tree, relating directories and what is below them
+		self.__trie = CommitModel.PathTrie()
+
+		# task -> revisions of every commit seen in the log
+		self.__tickets = CommitModel.TicketIndex()
+
+		# answers the svn queries of a run, chosen by its options
+		self.__backend = None
+
+		# the commits a daemon keeps in memory between queries, and what it
+		# derived from them: the mergeinfo and the last index
+		self.__warm = None
+		self.__warm_state = {}
+
 	def execute(self, arguments = None):
+		# hands the query to a running daemon, runs it in process otherwise
 		if arguments == None:
 			arguments = self.__ARGS
-	
-		svn_location = self.__CONST['svn_location']
-		svn_env = self.__CONST['svn_env']
-		ignore_file_list = self.__CONST['ignore_file_list']
-		show_colliding_files = False
-		config = {}
 
+		config = self.__parseOptions(arguments)
+		socket_path = config.get('socket', os.path.join(self.__CONST['temp_path'] or '.', 'svn_merge.sock'))
+		if config['daemon']:
+			self.__warm = CommitCache.createMemory()
+			sys.exit(MergeDaemon.create(self, socket_path, config['poll']).serve(arguments))
+
+		if config['notify'] or config['stop']:
+			code = MergeDaemon.request(socket_path, {'notify': True} if config['notify'] else {'stop': True})
+			if code is None:
+				sys.stderr.write('No daemon is listening on [' + socket_path + ']\n')
+				sys.exit(1)
+			return
+
+		# merges change the local working copy and ask for confirmation, they
+		# always run here; so does a batch read from stdin
+		local = config['merge'] or config['merge_resume'] or config.get('svn_batch') == '-'
+		if config['daemon_client'] and not local:
+			code = MergeDaemon.request(socket_path, {'arguments': MergeDaemon.absoluteArguments(arguments)})
+			if code is not None:
+				if code != 0:
+					sys.exit(code)
+				return
+
+		return self.run(arguments)
+
+	def run(self, arguments):
+		# runs the query in this process
+		config = self.__parseOptions(arguments)
+		self.__backend = self.__createBackend(config)
+		if 'svn_batch' in config:
+			candidates = self.__readCandidates(config['svn_batch'])
+			return self.__instrumented(config, lambda timer: self.__batch(candidates, config, timer))
+		if config['tracked'] or len(config['svn_track'])>0 or len(config['svn_untrack'])>0:
+			return self.__instrumented(config, lambda timer: self.__track(config, timer))
+
+		output = sys.stdout
+		if 'output' in config and config['output'] != '-':
+			output = open(config['output'], 'w')
 		try:
-			options, args = getopt.getopt(arguments,'',['range=','revision=','revisions=','ignore=','show-colliding-files'])
-		except getopt.GetoptError:
+			pairs = self.__CONST['merge_pairs']
+			if config['merge_resume']:
+				report = MergeReport.create(config['format'], output, self.__paths, config['show_colliding_files'])
+				result = self.__instrumented(config, lambda timer: self.__resumeMerge(timer, report))
+				report.close()
+			elif len(pairs) == 1:
+				report = MergeReport.create(config['format'], output, self.__paths, config['show_colliding_files'])
+				result = self.__instrumented(config, lambda timer: self.__analyse(config, timer, report, pairs[0]))
+				report.close()
+			else:
+				# one checkpoint per working copy would be needed to merge them all
+				if config['merge']:
+					sys.stderr.write('Merging needs a single source and target pair\n')
+					sys.exit(2)
+				group = MergeReport.createGroup(config['format'], output, self.__paths, config['show_colliding_files'])
+				result = self.__instrumented(config, lambda timer: self.__analysePairs(config, timer, group, pairs))
+				group.close()
+			return result
+		finally:
+			if output is not sys.stdout:
+				output.close()
+
+	def refresh(self, arguments):
+		# brings the warm state of a daemon up to date: the range is fetched
+		# again, which only asks svn for the revisions it does not have yet,
+		# and the mergeinfo is read again
+		config = self.__parseOptions(arguments)
+		if not 'svn_range' in config:
 			self.__getOut()
+		self.__backend = self.__createBackend(config)
+		self.__warm_state.pop('mergeinfo', None)
+		for source in sorted(set([pair['source'] for pair in self.__CONST['merge_pairs']])):
+			self.__fetchCommits(self.__CONST['svn_location']['repo'] + source, config)
+
+	def batch(self, candidates, arguments = None):
+		# analyses every candidate on its own against a log, mergeinfo and index
+		# loaded once; a candidate is a revision or comma separated revisions.
+		# writes one json record per candidate, in candidate order
+		if arguments == None:
+			arguments = self.__ARGS
 
-		for opt, arg in options:
-			if opt == '--revision':
-				config['svn_revision'] = arg
-			if opt == '--range':
-				config['svn_range'] = arg
-			if opt == '--revisions':
-				config['svn_revisions'] = arg
-			if opt == '--ignore':
-				config['svn_ignore_revisions'] = arg
-			if opt == '--show-colliding-files':
-				show_colliding_files = True
+		config = self.__parseOptions(arguments)
+		self.__backend = self.__createBackend(config)
+		return self.__instrumented(config, lambda timer: self.__batch(candidates, config, timer))
+
+	def __createBackend(self, config):
+		try:
+			return SvnBackend.create(config['svn_backend'])
+		except SvnBackend.SvnError as e:
+			sys.stderr.write(str(e) + '\n')
+			sys.exit(2)
+
+	def __instrumented(self, config, run):
+		# runs an analysis with the requested phase timings and profiling
+		# tracing the heap slows every phase down, it is asked for apart
+		timer = PhaseTimer.create('timings' in config, config['trace_memory'])
+		profiler = None
+		if 'profile' in config:
+			profiler = cProfile.Profile()
+			profiler.enable()
+		try:
+			return run(timer)
+		finally:
+			if profiler is not None:
+				profiler.disable()
+				profiler.dump_stats(config['profile'])
+			if 'timings' in config:
+				timer.stop()
+				timer.write(config['timings'], {'range': config.get('svn_range')})
+
+	def __analyse(self, config, timer, report, pair):
+		analysis = self.__prepare(config, timer, pair)
+		if 'auto_range' in analysis:
+			report.autoRange(analysis['auto_range'])
+		if 'notice' in analysis:
+			report.notice(*analysis['notice'])
+			return
+		report.start(analysis['revisions'], analysis['checked_revisions'], analysis['is_single_revision'], len(analysis['commits']))
+
+		# the collisions are handed to the report as the closure finds them
+		with timer.phase('collision_closure') as phase:
+			closure = CollisionClosure.create(
+				analysis['commits'], analysis['index'], analysis['ignored_files'], analysis['ignored_revisions']
+			)
+			for co in closure.collisions(analysis['checked_revisions']):
+				report.collision(co)
+			phase['items'] = len(report.collisions())
+
+		self.__conclude(config, timer, report, analysis)
+
+	def __analysePairs(self, config, timer, group, pairs):
+		# every pair on its own, sharing the logs: each source is fetched once
+		# and all of them at the same time into a memory store; the closures
+		# of the pairs run in parallel
+		repo = self.__CONST['svn_location']['repo']
+		temporary = self.__warm is None
+		if temporary:
+			self.__warm = CommitCache.createMemory()
+		try:
+			# an inferred range depends on the target, its gaps are fetched per pair
+			sources = sorted(set([pair['source'] for pair in pairs]))
+			if not config['auto_range']:
+				with timer.phase('svn_log') as phase:
+					with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+						fetched = list(executor.map(lambda source: self.__fetchCommits(repo + source, config), sources))
+					phase['items'] = sum([len(commits) for commits in fetched])
+
+			analyses = []
+			for pair in pairs:
+				analyses.append((group.report(pair), self.__prepare(config, timer, pair)))
+			pending = [(report, analysis) for report, analysis in analyses if not 'notice' in analysis]
+
+			with timer.phase('collision_closure') as phase:
+				jobs = config['jobs'] if config['jobs'] > 0 else min(len(pending), os.cpu_count() or 1)
+				arguments = [(
+					analysis['commits'], analysis['index'], analysis['ignored_files'],
+					analysis['ignored_revisions'], analysis['checked_revisions']
+				) for report, analysis in pending]
+				if jobs > 1 and len(arguments) > 1:
+					with ProcessPoolExecutor(max_workers=min(jobs, len(arguments))) as executor:
+						results = list(executor.map(CollisionClosure.runClosure, arguments))
+				else:
+					results = [CollisionClosure.runClosure(argument) for argument in arguments]
+				phase['items'] = sum([len(collisions) for collisions in results])
+
+			# reported in the order of the pairs
+			results = iter(results)
+			for report, analysis in analyses:
+				if 'auto_range' in analysis:
+					report.autoRange(analysis['auto_range'])
+				if 'notice' in analysis:
+					report.notice(*analysis['notice'])
+					continue
+				report.start(analysis['revisions'], analysis['checked_revisions'], analysis['is_single_revision'], len(analysis['commits']))
+				for co in next(results):
+					report.collision(co)
+				self.__conclude(config, timer, report, analysis)
+		finally:
+			if temporary:
+				self.__warm = None
+				self.__warm_state.clear()
+
+	def __prepare(self, config, timer, pair):
+		# everything the closure of a pair needs; an analysis that ends early
+		# holds the notice for its report instead
+		svn_location = self.__CONST['svn_location']
 
 		if not 'svn_range' in config:
 			self.__getOut()
-		if (not 'svn_revision' in config) and (not 'svn_revisions' in config):
+		if (not 'svn_revision' in config) and (not 'svn_revisions' in config) and (not 'svn_tickets' in config):
 			self.__getOut()
 
-		# parse the target revision
+		analysis = {}
+		analysis['pair'] = pair
+
+		# parse the target revision, tickets are expanded once the log is read
 		revisions = []
 		is_single_revision = True
-		try:
-			revisions = [int(config['svn_revision'])]
-		except:
+		if 'svn_tickets' in config:
+			is_single_revision = False
+		else:
 			try:
-				multiple_revisions = config['svn_revisions'].split(',')
-				for single_revision in multiple_revisions:
-					revisions.append(int(single_revision.strip()))
-				is_single_revision = False
+				revisions = [int(config['svn_revision'])]
 			except:
-				self.__getOut()
-
-		ignored_revisions = set()
-		try:
-			if 'svn_ignore_revisions' in config:
-				multiple_revisions = config['svn_ignore_revisions'].split(',')
-				for single_revision in multiple_revisions:
-					ignored_revisions.add(int(single_revision))
-		except:
-			pass
+				try:
+					multiple_revisions = config['svn_revisions'].split(',')
+					for single_revision in multiple_revisions:
+						revisions.append(int(single_revision.strip()))
+					is_single_revision = False
+				except:
+					self.__getOut()
+
+		ignored_revisions = self.__parseIgnoredRevisions(config)
+
+		# an inferred range needs the merged revisions before the log
+		repo_path = svn_location['repo'] + pair['source']
+		ranges = None
+		if config['auto_range']:
+			ranges, notice = self.__mergedRanges(timer, pair)
+			if notice is not None:
+				return self.__ended(analysis, notice)
+			gaps, analysis['auto_range'] = self.__autoRange(repo_path, ranges, revisions, config)
+			if gaps is None:
+				return self.__ended(analysis, ('no_revisions', 'The range to fetch cannot be inferred'))
+			config = dict(config, svn_range=analysis['auto_range']['range'])
 
 		# find the commits in the specified range; sorted by their revision number
-		repo_path = svn_location['repo'] + svn_env['trunk']
-		cmd_args = ['svn','log','-v','-r' + config['svn_range']]
-		cmd_args.append(repo_path)
-		cmd_str = ' '.join(cmd_args)
-		cmd = subprocess.Popen(cmd_args, stdout=subprocess.PIPE)
-		cmd_out, cmd_err = cmd.communicate()
-
-		commits = [];
-		if len(cmd_out) > 0:
-			commits = self.__parseLog(cmd_out, config)
-		else:
-			print('No revisions to merge')
-			return
+		with timer.phase('svn_log') as phase:
+			if config['auto_range']:
+				commits = self.__fetchGaps(repo_path, gaps, config)
+			else:
+				commits = self.__fetchCommits(repo_path, config)
+			phase['items'] = len(commits)
+		if len(commits) <= 0:
+			return self.__ended(analysis, ('no_revisions', 'No revisions to merge'))
+
+		# revision -> position in commits
+		positions = SvnLog.positionCommits(commits)
+
+		# every revision of the tickets, straight from the ticket index
+		if 'svn_tickets' in config:
+			for ticket in config['svn_tickets'].split(','):
+				revisions.extend(self.__tickets.revisions(SvnLog.normalizeTicket(ticket)))
+			revisions = sorted(set(revisions))
 
 		checked_revisions = []
 		for revision in revisions:
-			if revision in [c['revision'] for c in commits]:
+			if revision in positions:
 				checked_revisions.append(revision)
 
 		if len(checked_revisions)<=0:
-			if is_single_revision:
-				print('The provided revision number ['+str(revisions[0])+'] is not in the merge list')
+			if 'svn_tickets' in config:
+				return self.__ended(analysis, ('not_in_range', 'None of the provided tickets ['+config['svn_tickets']+'] is referenced in the range'))
+			elif is_single_revision:
+				return self.__ended(analysis, ('not_in_range', 'The provided revision number ['+str(revisions[0])+'] is not in the merge list'))
 			else:
-				print('None of the provided revision numbers is in the merge list')
-			return
+				return self.__ended(analysis, ('not_in_range', 'None of the provided revision numbers is in the merge list'))
 
 		# also ignore the revisions that are being checked, their mutual dependency is irrelevant
 		for revision in checked_revisions:
 			ignored_revisions.add(revision)
 
-		# find the merge information; sorted by revision
-		cmd_args = ['svn','propget','svn:mergeinfo']
-		cmd_args.append(svn_location['local'])
-		cmd_str = ' '.join(cmd_args)
-		cmd = subprocess.Popen(cmd_args, stdout=subprocess.PIPE)
-		cmd_out, cmd_err = cmd.communicate()
-
-		merges = {}
-		if len(cmd_out) > 0:
-			merges = self.__parseMergeInfo(cmd_out, config)
-		else:
-			print('No merge info, everything can be merged')
-			return
-
-		# get the ranges for the source merge path we are interested in
-		try:
-			ranges = merges[svn_env['trunk']]
-		except:
-			print('No merges from '+svn_env['trunk']+' present!')
-			return
-
-		# find the start position in the merge info 
-		position = 0;
-		if (len(commits)>0 and len(ranges)>0):
-			first_commit = commits[0]
-			position = self.__findRangePosition(ranges, first_commit)
+		if ranges is None:
+			ranges, notice = self.__mergedRanges(timer, pair)
+			if notice is not None:
+				return self.__ended(analysis, notice)
 
 		# eliminate the commits that are already merged
-		# if the first commit was not in the range then none of them are
-		# else find commits that are already merged and filter them out
-		if position>=0:
-			commits = [c for c in commits if not self.__isMerged(ranges, c, position)]
-
-		print('---------------------------------------------------------------')	
-		print('There are ['+str(len(commits))+'] commits to be merged.')
-		print('')	
-
+		with timer.phase('filter_merged') as phase:
+			commits, positions = SvnLog.filterMerged(commits, ranges)
+			phase['items'] = len(commits)
+
+		# the parts of a ticket that are merged already are no targets
+		if 'svn_tickets' in config:
+			checked_revisions = [revision for revision in checked_revisions if revision in positions]
+			if len(checked_revisions)<=0:
+				return self.__ended(analysis, ('merged', 'Every revision of the tickets ['+config['svn_tickets']+'] is merged already'))
+
+		# index the remaining commits once, every target of this run shares it
+		with timer.phase('index') as phase:
+			index = self.__indexCommits(commits, positions, ranges, config, pair)
+			phase['items'] = len(self.__paths)
+
+		analysis['repo_path'] = repo_path
+		analysis['revisions'] = revisions
+		analysis['checked_revisions'] = checked_revisions
+		analysis['is_single_revision'] = is_single_revision
+		analysis['commits'] = commits
+		analysis['positions'] = positions
+		analysis['index'] = index
 		# prepare the ignore list for files to be ignored for collisions
-		ignored_files = {}
-		for file_path in ignore_file_list:
-			full_path = svn_env['trunk'] + file_path
-			ignored_files[full_path] = True
-
-		collisions = {}
-		collisions['items'] = []
-		collisions['opnumbers'] = set()
-		collisions['contains'] = set()
+		analysis['ignored_files'] = self.__findIgnoredFiles(pair['source'])
+		analysis['ignored_revisions'] = ignored_revisions
+		return analysis
+
+	def __ended(self, analysis, notice):
+		# an analysis that ends early holds the notice for its report
+		analysis['notice'] = notice
+		return analysis
+
+	def __mergedRanges(self, timer, pair):
+		# the merged ranges of the source of a pair in the mergeinfo of its
+		# target, or the notice why there are none
+		with timer.phase('svn_mergeinfo') as phase:
+			merge_info = self.__mergeInfo(pair['target'])
+			phase['items'] = len(merge_info)
+
+		if len(merge_info) <= 0:
+			return None, ('no_mergeinfo', 'No merge info, everything can be merged')
+		with timer.phase('parse_mergeinfo') as phase:
+			merges = SvnLog.parseMergeInfo(merge_info)
+			phase['items'] = sum([len(ranges['from']) for ranges in merges.values()])
 
-		for revision in checked_revisions:
-			self.__findCollisions(commits, revision, collisions, ignored_files, ignored_revisions)
-
-		all_collisions = collisions['items']
-
-		# group by task number		
-		collisions_by_op_number = {}
-		for co in all_collisions:
-			op_number = co['opnumber']
-			if not (op_number in collisions_by_op_number):
-				collisions_by_op_number[op_number] = []
-			collisions_by_op_number[op_number].append(co);
-
-		# sort by revision in each group
-		for op_number in collisions_by_op_number:
-			collisions_by_op_number[op_number] = sorted(
-				collisions_by_op_number[op_number], 
-				key=lambda co: co['revision']
-			)
-
-		# print out report
-		if collisions_by_op_number:
-			if is_single_revision:
-				print('Revision ['+str(revisions[0])+'] collides with the following commits:')
-			else:
-				print(
-					'Provided revisions ['
-					+ self.__revisions_as_string(checked_revisions, ', ')
-					+'] collide with the following commits:'
-				)
-			for op_number in collisions_by_op_number:
-				task_collisions = collisions_by_op_number[op_number]
-				print(' * Task ['+op_number+'] collisions:')
-				for co in task_collisions:
-					print('   * ', end='')
-					print(
-						'Revision: ['
-						+ str(co['revision'])
-						+ ']'
-					)
-				print('')
-			print('~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~')
-			if is_single_revision:
-				print('One liner: '+str(revisions[0])+' - ', end='')
-			else:
-				print('One liner: '+ self.__revisions_as_string(checked_revisions, '/')+' - ', end='')
-			first_op_number = True
-			for op_number in collisions_by_op_number:
-				if not first_op_number:
-					print(', ', end='')
-				first_op_number = False
-				task_collisions = collisions_by_op_number[op_number]
-				first_task_collision = True
-				for co in task_collisions:
-					if not first_task_collision:
-						print('/', end='')
-					first_task_collision = False
-					print(str(co['revision']), end='')
-				print('('+op_number+')',end='')
-			print('')
-			print('~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~')
-
-			if show_colliding_files:
-				print('~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~')
-				print('Detailed report listing colliding files follows:')
-				print('~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~')
-				for co in all_collisions:
-					print('~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~')
-					if not co['filecollision']:
-						print('Revision ['
-								+ str(co['revision'])
-								+ '] has no colliding files but references Task ['
-								+ co['opnumber']
-								+ ']'
-						)
-					else:
-						file_collision_reason = ' directly with revision ['+str(co['collideswith'])+']'
-						if co['depth']!=0:
-							file_collision_reason = ' indirectly via revision ['+str(co['collideswith'])+']'
-						print(
-							'Revision: ['
-							+ str(co['revision'])
-							+ '] for task: ['
-							+ co['opnumber']
-							+ '] collides'
-							+ file_collision_reason
-						)
-						print('Files:')
-						for file_path in co['files']:
-							print('>> ' + file_path)
-
-					print('~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~')
-					print('')
-		else:
-			print('No collisions detected, merge can be performed')
-
-		print('---------------------------------------------------------------')	
-		print('Done.')
+		# get the ranges for the source merge path we are interested in
+		if not pair['source'] in merges:
+			return None, ('no_merges', 'No merges from '+pair['source']+' present!')
+		return merges[pair['source']], None
+
+	def __autoRange(self, repo_path, ranges, revisions, config):
+		# the smallest part of --range an analysis needs: from the first
+		# revision after the merged run the range starts in, up to the
+		# highest target or the range end, without the merged runs in
+		# between. The start is always the one of --range, the mergeinfo
+		# cannot tell the unmerged revisions before its first merge apart
+		# from revisions older than the branch.
+		# returns the gaps to fetch and the summary, or None, None
+		requested = self.__parseRange(repo_path, config['svn_range'])
+		if requested is None:
+			return None, None
+
+		end = requested[1]
+		if len(revisions)>0:
+			end = max(min(end, max(revisions)), requested[0] - 1)
+		gaps = SvnLog.unmergedGaps(ranges, requested[0], end)
+
+		summary = {}
+		summary['range'] = str(gaps[0][0]) + ':' + str(gaps[-1][1]) if len(gaps)>0 else None
+		summary['gaps'] = len(gaps)
+		summary['requested_range'] = str(requested[0]) + ':' + str(requested[1])
+		summary['requested_revisions'] = requested[1] - requested[0] + 1
+		summary['fetched_revisions'] = sum([gap_end - gap_start + 1 for gap_start, gap_end in gaps])
+		# what is not fetched up to the end is merged, what follows it is past the targets
+		summary['skipped_revisions'] = end - requested[0] + 1 - summary['fetched_revisions']
+		summary['past_target_revisions'] = requested[1] - end
+		return gaps, summary
+
+	def __fetchGaps(self, repo_path, gaps, config):
+		# the commits of the gaps of an inferred range, each through the caches
+		commits = []
+		for gap_start, gap_end in gaps:
+			commits.extend(self.__fetchCommits(repo_path, dict(config, svn_range=str(gap_start) + ':' + str(gap_end))))
+		return commits
 
-	def __revisions_as_string(self, revisions, separator):
-		return separator.join(map(lambda x: str(x), revisions))
-	
-	def __findCollisions(self, commits, revision, collisions, ignored_files, ignored_revisions, depth = 0):
-		# get the target commit
-		position = self.__findCommitPosition(commits, revision)
-		if position < 0:
+	def __conclude(self, config, timer, report, analysis):
+		# the targets and everything they depend on, in as few svn merge calls as possible
+		plan = None
+		if config['merge_plan'] or config['merge']:
+			with timer.phase('merge_plan') as phase:
+				plan_revisions = analysis['checked_revisions'] + [co['revision'] for co in report.collisions()]
+				plan = MergePlan.create(plan_revisions, analysis['positions'], analysis['repo_path'], analysis['pair']['target'])
+				phase['items'] = len(plan.steps())
+			report.plan(plan)
+
+		with timer.phase('report') as phase:
+			phase['items'] = len(report.collisions())
+			report.finish()
+
+		if config['merge'] and (config['merge_confirmed'] or self.__sysPrompt('Do You want to execute the svn merge?')):
+			with timer.phase('merge') as phase:
+				phase['items'] = self.__runPlan(plan, report)
+
+	def __resumeMerge(self, timer, report):
+		# continues the merge of the last checkpoint, the step that stopped
+		# is run again; svn skips the revisions it already merged
+		plan = MergePlan.load(self.__checkpointFile())
+		if plan is None:
+			report.notice('no_checkpoint', 'No interrupted merge to resume')
 			return
-		if position == 0:
+		with timer.phase('merge') as phase:
+			phase['items'] = self.__runPlan(plan, report)
+
+	def __runPlan(self, plan, report):
+		# runs the remaining steps, checkpointing after each; stops at the first
+		# failing or conflicting step. returns the number of merged steps
+		checkpoint_file = self.__checkpointFile()
+		plan.save(checkpoint_file)
+		steps = plan.steps()
+
+		merged = 0
+		while not plan.done():
+			step = steps[plan.nextStep()]
+			event = {}
+			event['step'] = plan.nextStep() + 1
+			event['steps'] = len(steps)
+			event['command'] = plan.command(step)
+			event['revisions'] = step['revisions']
+			try:
+				# a working copy with conflicts cannot take another merge
+				conflicts = self.__backend.conflicts(plan.target())
+				if len(conflicts) <= 0:
+					self.__backend.merge(plan.source(), plan.target(), MergePlan.stepRanges(step))
+					conflicts = self.__backend.conflicts(plan.target())
+			except SvnBackend.SvnError as e:
+				event['status'] = 'failed'
+				event['message'] = str(e)
+				report.mergeStep(event)
+				return merged
+
+			if len(conflicts) > 0:
+				event['status'] = 'conflict'
+				event['conflicts'] = conflicts
+				report.mergeStep(event)
+				return merged
+
+			event['status'] = 'merged'
+			plan.advance()
+			plan.save(checkpoint_file)
+			report.mergeStep(event)
+			merged = merged + 1
+
+		os.remove(checkpoint_file)
+		return merged
+
+	def __checkpointFile(self):
+		return os.path.join(self.__CONST['temp_path'] or '.', 'svn_merge_checkpoint.json')
+
+	def __batch(self, candidates, config, timer):
+		# the candidates are checked against the first pair
+		log = self.__loadCandidateLog(config, timer, candidates)
+
+		records = []
+		analysed = []
+		for candidate in candidates:
+			record = self.__candidateRecord(candidate, log)
+			if record['status'] == 'pending':
+				analysed.append(record['checked_revisions'])
+			del record['checked_revisions']
+			records.append(record)
+
+		# the closures are independent, they are spread over a process pool;
+		# they are computed lazily, so their time is part of the report phase
+		executor, results = self.__closures(analysed, log, config)
+
+		output = sys.stdout
+		if 'output' in config and config['output'] != '-':
+			output = open(config['output'], 'w')
+		try:
+			with timer.phase('collision_closure_report') as phase:
+				phase['items'] = len(analysed)
+				self.__writeBatch(records, results, output, config)
+		finally:
+			if output is not sys.stdout:
+				output.close()
+			if executor is not None:
+				executor.shutdown()
+
+	def __track(self, config, timer):
+		# keeps the closures of the tracked candidates between runs and reports
+		# them as batch records; only the closures the changes since the last
+		# run can reach are computed again
+		state_file = self.__trackedFile()
+		state = ClosureState.load(state_file)
+		for candidate in config['svn_untrack']:
+			state.untrack(candidate)
+		for candidate in config['svn_track']:
+			state.track(candidate)
+		if not config['tracked']:
+			state.save(state_file)
 			return
 
-		# prepare the target commit, it's files become a set
-		target_commit = commits[position]
-		target_commit_files = {}
-		for file_path in target_commit['files']:
-			target_commit_files[file_path] = True
-
-		# truncate the commits to preceding ones only
-		position_commits = commits[:position]
-
-		collision_closure = [];
-
-		# find the collisions
-		for c in position_commits:
-			colliding_revision = c['revision']
-			if colliding_revision in ignored_revisions:
+		log = self.__loadCandidateLog(config, timer, state.candidates())
+		unmerged = set(log['unmerged_positions'])
+		settings = {}
+		settings['source'] = log['pair']['source']
+		settings['target'] = log['pair']['target']
+		settings['start'] = log['start']
+		settings['ignored_revisions'] = sorted(log['ignored_revisions'])
+		settings['ignore_file_list'] = self.__CONST['ignore_file_list']
+		with timer.phase('stale_closures') as phase:
+			stale = state.stale(log['all_commits'], unmerged, self.__paths, settings)
+			phase['items'] = len(stale)
+
+		records = []
+		recomputed = []
+		for candidate in state.candidates():
+			record = self.__candidateRecord(candidate, log)
+			checked_revisions = record.pop('checked_revisions')
+			records.append(record)
+			if record['status'] != 'pending':
+				# its targets left the log, the changes to come are not followed
+				state.drop(candidate)
 				continue
-			op_number = c['opnumber']
-
-			files = []
-			for file_path in c['files']:
-				if file_path in ignored_files:
-					continue
-				if file_path in target_commit_files:
-					files.append(file_path)
-
-			file_collision_found = (len(files)>0)
-			task_collision_found = (op_number in collisions['opnumbers'])
-			collision_present = (colliding_revision in collisions['contains'])
-
-			if (file_collision_found or task_collision_found) and (not collision_present):
-				collisions['contains'].add(colliding_revision)
-				collisions['opnumbers'].add(op_number)
-				collision_closure.append(colliding_revision)
-
-				collision = {}
-				collision['revision'] = colliding_revision
-				collision['opnumber'] = op_number
-				collision['files'] = files
-				collision['depth'] = depth
-				collision['filecollision'] = file_collision_found 
-
-				if (file_collision_found):
-					collision['collideswith'] = target_commit['revision']
-				else:
-					collision['collideswith'] = None
-
-				collisions['items'].append(collision)
-		
-		# recursive closure determination
-		for colloding_revision in collision_closure:
-			self.__findCollisions(commits, colliding_revision, collisions, ignored_files, ignored_revisions, depth+1)
-
-	def __parseLog(self, svn_str, config):
-		commits = []
-
-		svn_log_output = re.sub(r'(\-{10,})([\n\r]+)', "BREAK\n\n", svn_str.decode('utf-8'))
-		svn_log_lines = svn_log_output.split("BREAK\n\n")
-
-		if len(svn_log_lines) <= 0:
-			return commits;
-
-		for svn_log_line in svn_log_lines:
-			tmp = svn_log_line.strip()
-			if (len(tmp) > 0):
-				commits.append(tmp)
-		
-		if len(commits) > 0:
-			for i,svn_log_line in enumerate(commits):
-				tmp_log_data =  self.__parseLogData(svn_log_line)
-				if tmp_log_data:
-					commits[i] = tmp_log_data
-
-		return commits
-
-	def __parseLogData(self, log_data):
-		obj = {}
-
-		log_data_lines = log_data.split('\n')
-
-		if len(log_data_lines) <= 0:
-			return obj
-
-		tmp = log_data_lines[0].strip().split("|")
-
-		for i,val in enumerate(tmp):
-			val = val.strip()
-			if (i == 0):
-				obj['revision'] = int(val[1:])
-			if (i == 1):
-				obj['user'] = val
-			if (i == 2):
-				obj['timestamp'] = val
-				if (i == 3):
-					obj['lines'] = val
-
-		obj['files'] = []
-		
-		if len(log_data_lines) < 2:
-			return obj
-
-		svn_env = self.__CONST['svn_env']
-		location = svn_env['trunk']
+			closure = state.closure(candidate)
+			if candidate in stale or closure is None or closure['revisions'] != checked_revisions:
+				recomputed.append((record, checked_revisions))
+				continue
+			record['recomputed'] = False
+			record['collisions'] = closure['collisions']
 
-		rest = log_data_lines[1:]
-		comment_pending = False 
-		comment_set = False
+		executor, results = self.__closures([checked for record, checked in recomputed], log, config)
+		try:
+			with timer.phase('collision_closure') as phase:
+				phase['items'] = len(recomputed)
+				for record, checked_revisions in recomputed:
+					collisions = next(results)
+					record['recomputed'] = True
+					record['collisions'] = [MergeReport.collisionRecord(co, self.__paths, True) for co in collisions]
+
+					# what the closure consists of: its targets and the commits it visited
+					members = [log['all_commits'][log['positions'][revision]] for revision in checked_revisions]
+					members.extend([log['all_commits'][log['positions'][co['revision']]] for co in collisions])
+					tickets = set([c.opnumber for c in members])
+					paths = set([self.__paths.path(file_id) for c in members for file_id in c.files])
+					state.store(record['candidate'], checked_revisions, record['collisions'], tickets, paths)
+		finally:
+			if executor is not None:
+				executor.shutdown()
+
+		state.advance(log['all_commits'], unmerged, settings)
+		state.save(state_file)
+
+		output = sys.stdout
+		if 'output' in config and config['output'] != '-':
+			output = open(config['output'], 'w')
+		try:
+			for record in records:
+				if record['status'] == 'pending':
+					collisions = record['collisions']
+					record['status'] = 'collides' if len(collisions)>0 else 'clean'
+					if len(collisions)>0:
+						label = MergeReport.revisionsAsString(record['revisions'], '/')
+						record['oneliner'] = MergeReport.oneLiner(label, MergeReport.groupByTask(collisions))
+					if not config['show_colliding_files']:
+						record['collisions'] = [dict([(key, co[key]) for key in co if key != 'files']) for co in collisions]
+				output.write(json.dumps(record) + '\n')
+		finally:
+			if output is not sys.stdout:
+				output.close()
+
+	def __trackedFile(self):
+		return os.path.join(self.__CONST['temp_path'] or '.', 'svn_merge_tracked.json')
+
+	def __loadCandidateLog(self, config, timer, candidates):
+		# the log, mergeinfo and index of the first pair that candidates are
+		# analysed against
+		svn_location = self.__CONST['svn_location']
+		pair = self.__CONST['merge_pairs'][0]
 
-		for line in rest:
-			line_entry = line.strip();
+		if not 'svn_range' in config:
+			self.__getOut()
 
-			if (len(line_entry)==0):
-				comment_pending = True
-			elif comment_pending:
-				if not comment_set: 
-					obj['comment'] = line_entry
-				else:
-					obj['comment'] = obj['comment'] + '\n' + line_entry
-			
-				if not comment_set:
-					line_search = re.search('\[.*\]\s*\(\s*(OP\s*\d+)\){1}', line_entry, re.IGNORECASE)
-					if line_search:
-						op_number = line_search.group(1)
-						op_number = re.sub('\s*OP\s*', "#", op_number)
-						obj['opnumber'] = op_number
-						break
-					else:
-						line_search = re.search('\[.*\]\s*\(\s*(\w+)\){1}', line_entry, re.IGNORECASE)
-						if line_search:
-							op_number = line_search.group(1)
-							obj['opnumber'] = op_number
-						else:
-							obj['opnumber'] = 'unknown'
-				comment_set = True
+		log = {}
+		log['pair'] = pair
+		repo_path = svn_location['repo'] + pair['source']
+
+		# candidates already merged are told apart from the ones out of range
+		with timer.phase('svn_mergeinfo') as phase:
+			ranges = self.__fetchMergeRanges(pair)
+			if ranges is None:
+				ranges = SvnLog.coalesceRanges([])
+			phase['items'] = len(ranges['from'])
+		log['ranges'] = ranges
+		log['auto_range'] = config['auto_range']
+
+		# an inferred range ends at the highest candidate
+		gaps = None
+		if config['auto_range']:
+			revisions = []
+			for candidate in candidates:
+				revisions.extend([int(revision) for revision in str(candidate).split(',') if revision.strip().isdigit()])
+			gaps, summary = self.__autoRange(repo_path, ranges, revisions, config)
+			if gaps is None:
+				sys.stderr.write('The range to fetch cannot be inferred from [' + config['svn_range'] + ']\n')
+				sys.exit(2)
+			sys.stderr.write(MergeReport.autoRangeLine(summary) + '\n')
+			config = dict(config, svn_range=summary['range'])
+
+		with timer.phase('svn_log') as phase:
+			if gaps is None:
+				log['all_commits'] = self.__fetchCommits(repo_path, config)
 			else:
-				if line_entry.startswith(('A ', 'D ', 'U ', 'M ', 'G ', 'E ', 'R ')):
-					file_path = line_entry[2:].strip()
-					obj['files'].append(file_path)
-
-		return obj
-
-	def __parseMergeInfo(self, merge_info, config):
-		merges = {};
-
-		merge_info_lines = merge_info.decode('utf-8').split('\n')
-
-		if len(merge_info_lines)<=0:
-			return merges;
-		
-		for info_line in merge_info_lines:
-			merge_item = [];
-			info_item = info_line.split(':')
-			if len(info_item)<2:
-				continue
-
-			merge_source_path = info_item[0].strip()
-			if merge_source_path in merges:
-				merge_item = merges[merge_source_path]
+				log['all_commits'] = self.__fetchGaps(repo_path, gaps, config)
+			phase['items'] = len(log['all_commits'])
+		log['positions'] = SvnLog.positionCommits(log['all_commits'])
+		# where the closures start
+		if gaps is not None:
+			log['start'] = int(summary['requested_range'].split(':')[0])
+		else:
+			log['start'] = log['all_commits'][0].revision if len(log['all_commits'])>0 else None
+
+		with timer.phase('filter_merged') as phase:
+			log['commits'], log['unmerged_positions'] = SvnLog.filterMerged(log['all_commits'], ranges)
+			phase['items'] = len(log['commits'])
+
+		log['ignored_revisions'] = self.__parseIgnoredRevisions(config)
+		log['ignored_files'] = self.__findIgnoredFiles(pair['source'])
+		with timer.phase('index') as phase:
+			log['index'] = self.__indexCommits(log['commits'], log['unmerged_positions'], ranges, config, pair)
+			phase['items'] = len(self.__paths)
+		return log
+
+	def __candidateRecord(self, candidate, log):
+		# the batch record of a candidate before its closure, with the
+		# revisions to analyse when it is pending
+		record = {}
+		record['candidate'] = str(candidate).strip()
+		record['revisions'] = []
+		record['checked_revisions'] = []
+		try:
+			for single_revision in record['candidate'].split(','):
+				record['revisions'].append(int(single_revision.strip()))
+			record['checked_revisions'] = [r for r in record['revisions'] if r in log['unmerged_positions']]
+			if len(record['checked_revisions'])>0:
+				record['status'] = 'pending'
+			elif len([r for r in record['revisions'] if r in log['positions']])>0:
+				record['status'] = 'merged'
+			elif log['auto_range'] and len([r for r in record['revisions'] if SvnLog.isMerged(log['ranges'], r)])>0:
+				# an inferred range does not fetch the merged revisions
+				record['status'] = 'merged'
 			else:
-				merges[merge_source_path] = merge_item
-			
-			merge_revisions_combined = info_item[1]
-			if len(merge_revisions_combined)<=0:
-				continue
-
-			merge_revisions = merge_revisions_combined.split(',')
-			if len(merge_revisions)<=0:
-				continue
+				record['status'] = 'not_in_range'
+		except ValueError:
+			record['status'] = 'invalid'
+		return record
+
+	def __closures(self, analysed, log, config):
+		# the collisions of every analysed revision list, in order, with the
+		# process pool computing them when there are several jobs
+		jobs = config['jobs']
+		closure_arguments = (log['commits'], log['index'], log['ignored_files'], log['ignored_revisions'])
+		if jobs > 1 and len(analysed) > 1:
+			executor = ProcessPoolExecutor(
+				max_workers=jobs,
+				initializer=CollisionClosure.initWorker,
+				initargs=closure_arguments
+			)
+			return executor, executor.map(CollisionClosure.runWorker, analysed, chunksize=max(1, len(analysed) // (jobs*4)))
+		closure = CollisionClosure.create(*closure_arguments)
+		return None, map(closure.run, analysed)
+
+	def __writeBatch(self, records, results, output, config):
+		for record in records:
+			if record['status'] == 'pending':
+				collisions = next(results)
+				record['status'] = 'collides' if len(collisions)>0 else 'clean'
+				record['collisions'] = []
+				for co in collisions:
+					record['collisions'].append(MergeReport.collisionRecord(co, self.__paths, config['show_colliding_files']))
+				if len(collisions)>0:
+					label = MergeReport.revisionsAsString(record['revisions'], '/')
+					record['oneliner'] = MergeReport.oneLiner(label, MergeReport.groupByTask(collisions))
+			output.write(json.dumps(record) + '\n')
+
+	def __parseOptions(self, arguments):
+		config = {}
+		config['show_colliding_files'] = False
+		config['svn_cache'] = 'on'
+		config['svn_log_format'] = 'xml'
+		config['svn_fetch_jobs'] = 1
+		config['svn_chunk_size'] = 5000
+		config['svn_fetch_retries'] = 2
+		# 0: a process per pair when several pairs are analysed, none otherwise
+		config['jobs'] = 0
+		config['format'] = 'text'
+		config['svn_backend'] = 'cli'
+		config['merge_plan'] = False
+		config['merge'] = False
+		config['merge_confirmed'] = False
+		config['merge_resume'] = False
+		config['daemon'] = False
+		config['daemon_client'] = True
+		config['poll'] = 60
+		config['notify'] = False
+		config['stop'] = False
+		config['tracked'] = False
+		config['auto_range'] = False
+		config['trace_memory'] = False
+		config['svn_track'] = []
+		config['svn_untrack'] = []
 
-			for revision in merge_revisions:
-				revision_item = {}
-				revision_range = revision.split('-')
-				if len(revision_range)>1:
-					revision_item['from'] = int(revision_range[0].strip())
-					revision_item['to'] = int(revision_range[1].strip())
-				elif len(revision_range)==1:
-					revision_item['from'] = int(revision_range[0].strip())
-					revision_item['to'] = int(revision_range[0].strip())
-				else:
-					continue
-				merge_item.append(revision_item)
+		try:
+			options, args = getopt.getopt(arguments,'',[
+				'range=','revision=','revisions=','ignore=','show-colliding-files','no-cache','rebuild-cache',
+				'log-format=','fetch-jobs=','chunk-size=','fetch-retries=','batch=','output=','jobs=','timings=','trace-memory','profile=','format=','backend=',
+				'plan','merge','yes','resume','ticket=',
+				'daemon','poll=','socket=','no-daemon','notify','stop',
+				'track=','untrack=','tracked','auto-range'
+			])
+		except getopt.GetoptError:
+			self.__getOut()
 
-		return merges
+		for opt, arg in options:
+			if opt == '--revision':
+				config['svn_revision'] = arg
+			if opt == '--range':
+				config['svn_range'] = arg
+			if opt == '--auto-range':
+				config['auto_range'] = True
+			if opt == '--revisions':
+				config['svn_revisions'] = arg
+			if opt == '--ignore':
+				config['svn_ignore_revisions'] = arg
+			if opt == '--show-colliding-files':
+				config['show_colliding_files'] = True
+			if opt == '--no-cache':
+				config['svn_cache'] = 'off'
+			if opt == '--rebuild-cache':
+				config['svn_cache'] = 'rebuild'
+			if opt == '--log-format':
+				if not arg in ('xml', 'text'):
+					self.__getOut()
+				config['svn_log_format'] = arg
+			if opt in ('--fetch-jobs', '--chunk-size', '--fetch-retries'):
+				try:
+					config['svn_' + opt[2:].replace('-', '_')] = max(int(arg), 0 if opt == '--fetch-retries' else 1)
+				except ValueError:
+					self.__getOut()
+			if opt == '--batch':
+				config['svn_batch'] = arg
+			if opt == '--output':
+				config['output'] = arg
+			if opt == '--daemon':
+				config['daemon'] = True
+			if opt == '--no-daemon':
+				config['daemon_client'] = False
+			if opt == '--socket':
+				config['socket'] = arg
+			if opt == '--notify':
+				config['notify'] = True
+			if opt == '--stop':
+				config['stop'] = True
+			if opt == '--ticket':
+				config['svn_tickets'] = arg
+			if opt == '--track':
+				config['svn_track'].append(arg.strip())
+			if opt == '--untrack':
+				config['svn_untrack'].append(arg.strip())
+			if opt == '--tracked':
+				config['tracked'] = True
+			if opt == '--plan':
+				config['merge_plan'] = True
+			if opt == '--merge':
+				config['merge'] = True
+			if opt == '--yes':
+				config['merge_confirmed'] = True
+			if opt == '--resume':
+				config['merge_resume'] = True
+			if opt == '--backend':
+				config['svn_backend'] = arg
+			if opt == '--format':
+				if not arg in MergeReport.FORMATS:
+					self.__getOut()
+				config['format'] = arg
+			if opt == '--timings':
+				config['timings'] = arg
+			if opt == '--trace-memory':
+				config['trace_memory'] = True
+			if opt == '--profile':
+				config['profile'] = arg
+			if opt == '--jobs':
+				try:
+					config['jobs'] = max(int(arg), 1)
+				except ValueError:
+					self.__getOut()
+			if opt == '--poll':
+				try:
+					config['poll'] = max(int(arg), 0)
+				except ValueError:
+					self.__getOut()
+
+		return config
+
+	def __readCandidates(self, candidates_file):
+		if candidates_file == '-':
+			lines = sys.stdin.readlines()
+		else:
+			with open(candidates_file, 'r') as fin:
+				lines = fin.readlines()
+		return [line.strip() for line in lines if len(line.strip())>0]
 
-	def __findRangePosition(self, ranges, commit):
-		if len(ranges) <= 0:
-			return -1
+	def __parseIgnoredRevisions(self, config):
+		ignored_revisions = set()
+		try:
+			if 'svn_ignore_revisions' in config:
+				multiple_revisions = config['svn_ignore_revisions'].split(',')
+				for single_revision in multiple_revisions:
+					ignored_revisions.add(int(single_revision))
+		except:
+			pass
+		return ignored_revisions
+
+	def __findIgnoredFiles(self, source):
+		# the ids of the files of the source to be ignored for collisions; a
+		# rule is a path, a directory ending with '/' or a glob
+		self.__trie.update(self.__paths)
+		ignored_files = set()
+		for rule in self.__CONST['ignore_file_list']:
+			ignored_files.update(self.__trie.matching(self.__paths, source + rule))
+		return ignored_files
+
+	def __mergeInfo(self, local_path):
+		# the svn:mergeinfo of a working copy; a daemon reads it again only
+		# when the working copy database changed, as every local merge does
+		if self.__warm is None:
+			return self.__backend.mergeInfo(local_path)
+
+		wc_db = os.path.join(local_path, '.svn', 'wc.db')
+		stamp = os.path.getmtime(wc_db) if os.path.isfile(wc_db) else None
+		merge_infos = self.__warm_state.setdefault('mergeinfo', {})
+		cached = merge_infos.get(local_path)
+		if stamp is None or cached is None or cached[0] != stamp:
+			cached = merge_infos[local_path] = (stamp, self.__backend.mergeInfo(local_path))
+		return cached[1]
+
+	def __indexCommits(self, commits, positions, ranges, config, pair):
+		# a daemon reuses the index of a pair while neither the log nor the
+		# mergeinfo change
+		key = None
+		if self.__warm is not None:
+			key = (config['svn_range'], self.__warm.version(), ranges['from'].tobytes(), ranges['to'].tobytes())
+			indexes = self.__warm_state.setdefault('index', {})
+			cached = indexes.get((pair['source'], pair['target']))
+			if cached is not None and cached[0] == key:
+				return cached[1]
+
+		self.__trie.update(self.__paths)
+		index = CollisionClosure.indexCommits(commits, positions, self.__trie)
+		if key is not None:
+			indexes[(pair['source'], pair['target'])] = (key, index)
+		return index
+
+	def __fetchMergeRanges(self, pair):
+		# the merged ranges of the source path of a pair, None if there are none
+		merge_info = self.__mergeInfo(pair['target'])
+		if len(merge_info) <= 0:
+			return None
+		merges = SvnLog.parseMergeInfo(merge_info)
+		return merges.get(pair['source'])
+
+	def __fetchCommits(self, repo_path, config):
+		# serve the range from the memory of a daemon and the local commit
+		# cache, fetching only what they miss
+		temp_path = self.__CONST['temp_path']
+		use_cache = temp_path and config['svn_cache'] != 'off'
+		svn_range = None
+		if use_cache or config['svn_fetch_jobs'] > 1 or self.__warm is not None:
+			svn_range = self.__parseRange(repo_path, config['svn_range'])
+
+		if svn_range is None:
+			try:
+				commits = list(self.__fetchLog(repo_path, config['svn_range'], config))
+				commits.sort(key=lambda c: c.revision)
+				return commits
+			except SvnBackend.SvnError:
+				sys.stderr.write('Fetching the log for ['+config['svn_range']+'] failed\n')
+				return []
+
+		if self.__warm is None:
+			commits = self.__fetchStored(repo_path, svn_range[0], svn_range[1], config)
+			return [] if commits is None else commits
+
+		if config['svn_cache'] == 'rebuild':
+			self.__warm.clear(repo_path)
+		start, end = svn_range
+		for missing_start, missing_end in self.__warm.missingRanges(repo_path, start, end):
+			missing_commits = self.__fetchStored(repo_path, missing_start, missing_end, config)
+			if missing_commits is None:
+				return []
+			self.__warm.store(repo_path, missing_commits, self.__paths, missing_start, missing_end)
+		return self.__warm.load(repo_path, start, end, self.__paths, self.__tickets)
+
+	def __fetchStored(self, repo_path, start, end, config):
+		# the commits of start..end through the local commit cache, when there
+		# is one; None when the log cannot be fetched
+		temp_path = self.__CONST['temp_path']
+		if not temp_path or config['svn_cache'] == 'off':
+			try:
+				return self.__fetchRange(repo_path, start, end, config)
+			except SvnBackend.SvnError:
+				sys.stderr.write('Fetching the log for ['+str(start)+':'+str(end)+'] failed\n')
+				return None
 
-		position = 0
-		rev = commit['revision']
-		for r in ranges:
-			if (rev>=r['from'] and rev<=r['to']):
-				return position
-			if rev<r['from']:
-				return position
-			position = position + 1
-		return -1
+		cache = CommitCache.create(os.path.join(temp_path, 'svn_log_cache.sqlite'))
+		try:
+			if config['svn_cache'] == 'rebuild':
+				cache.clear(repo_path)
+
+			# the missing commits are stored while they are still being received
+			for missing_start, missing_end in cache.missingRanges(repo_path, start, end):
+				missing_range = str(missing_start) + ':' + str(missing_end)
+				try:
+					missing_commits = self.__fetchRange(repo_path, missing_start, missing_end, config)
+					cache.store(repo_path, missing_commits, self.__paths, missing_start, missing_end)
+				except SvnBackend.SvnError:
+					sys.stderr.write('Fetching the log for ['+missing_range+'] failed\n')
+					return None
+
+			return cache.load(repo_path, start, end, self.__paths, self.__tickets)
+		finally:
+			cache.close()
+
+	def __fetchRange(self, repo_path, start, end, config):
+		# the commits of start..end in revision order; with several fetch jobs
+		# the range is split into chunks which are fetched and parsed concurrently
+		chunk_size = config['svn_chunk_size']
+		chunks = []
+		for chunk_start in range(start, end+1, chunk_size):
+			chunks.append((chunk_start, min(chunk_start + chunk_size - 1, end)))
+
+		if config['svn_fetch_jobs'] <= 1 or len(chunks) <= 1:
+			commits = []
+			for chunk_start, chunk_end in chunks:
+				commits.extend(self.__fetchChunk(repo_path, chunk_start, chunk_end, config))
+			return commits
+
+		with ThreadPoolExecutor(max_workers=config['svn_fetch_jobs']) as executor:
+			futures = []
+			for chunk_start, chunk_end in chunks:
+				futures.append(executor.submit(self.__fetchChunk, repo_path, chunk_start, chunk_end, config))
+
+			commits = []
+			try:
+				for future in futures:
+					commits.extend(future.result())
+			except:
+				for future in futures:
+					future.cancel()
+				raise
+			return commits
+
+	def __fetchChunk(self, repo_path, start, end, config):
+		svn_range = str(start) + ':' + str(end)
+		attempt = 0
+		while True:
+			try:
+				commits = list(self.__fetchLog(repo_path, svn_range, config))
+				commits.sort(key=lambda c: c.revision)
+				return commits
+			except SvnBackend.SvnError:
+				if attempt >= config['svn_fetch_retries']:
+					raise
+				attempt = attempt + 1
+				time.sleep(attempt)
+
+	def __fetchLog(self, repo_path, svn_range, config):
+		# yields the commits of the range in the order svn reports them,
+		# raises SvnError when the log cannot be read
+		return self.__backend.log(repo_path, svn_range, self.__paths, config['svn_log_format'], self.__tickets)
+
+	def __parseRange(self, repo_path, svn_range):
+		# numeric bounds of a <revision>:<revision> range, HEAD is resolved
+		bounds = SvnBackend.parseRange(svn_range, lambda: self.__backend.headRevision(repo_path))
+		if bounds is None:
+			return None
+		return (min(bounds), max(bounds))
 
-	def __findCommitPosition(self, commits, revision):
-		if len(commits) <= 0:
-			return -1
-
-		position = 0
-		for c in commits:
-			if c['revision'] == revision:
-				return position
-			position = position + 1
-		return -1
-
-	def __isMerged(self, ranges, commit, start):
-		if len(ranges) <= 0:
-			return False
-		target_ranges = ranges
-		if start > 0:
-			target_ranges = ranges[start:]
-
-		rev = commit['revision']
-		for r in target_ranges:
-			if (rev>=r['from'] and rev<=r['to']):
-				return True
-		return False
-	
-	#	merge_prompt = self.__sysPrompt('Do You want to execute the svn merge?')
-	#if merge_prompt:
 	def __sysPrompt(self, prompt_str):
-		sys.stdout.write(prompt_str + ' [y/n]: ')
-		choice = raw_input().lower()
+		# asked on stderr, the report on stdout may be machine readable
+		sys.stderr.write(prompt_str + ' [y/n]: ')
+		sys.stderr.flush()
+		choice = sys.stdin.readline().strip().lower()
 		
 		if choice == 'y' or choice == 'yes':
 			ret = 1
@@ -497,5 +1025,10 @@ class MergeRevision:
 		return ret	
 	
 	def __getOut(self):
-		print('usage: merge.py [--revision=<revision>|--revisions=<revision>,<revision>...] --range=<revision>:<revision> [--ignore=<revision>,<revision>] [--show-colliding-files]')
+		print('usage: merge.py [--revision=<revision>|--revisions=<revision>,<revision>...|--ticket=<ticket>,<ticket>...] --range=<revision>:<revision> [--auto-range] [--ignore=<revision>,<revision>] [--show-colliding-files] [--no-cache|--rebuild-cache] [--log-format=xml|text] [--fetch-jobs=<jobs>] [--chunk-size=<revisions>] [--fetch-retries=<retries>] [--format=text|json|ndjson] [--output=<report-file>] [--plan|--merge [--yes]]')
+		print('       merge.py --resume')
+		print('       merge.py --daemon --range=<revision>:HEAD [--poll=<seconds>] | --notify | --stop')
+		print('       merge.py --batch=<candidates-file|-> --range=<revision>:<revision> [--auto-range] [--output=<ndjson-file>] [--jobs=<processes>] ...')
+		print('       merge.py [--track=<revision>,<revision>...] [--untrack=<revision>,<revision>...] [--tracked --range=<revision>:<revision> [--output=<ndjson-file>] [--jobs=<processes>] ...]')
+		print('       common: [--backend=cli|bindings|replay:<capture-folder>] [--timings=<json-file|-> [--trace-memory]] [--profile=<pstats-file>] [--socket=<socket-file>] [--no-daemon]')
 		sys.exit(2)
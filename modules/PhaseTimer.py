@@ -0,0 +1,69 @@
+import sys, time, json, tracemalloc
+from contextlib import contextmanager
+
+# set
+def create(enabled = True, trace_memory = False):
+	return PhaseTimer(enabled, trace_memory)
+
+
+class PhaseTimer:
+	# Records wall time, cpu time, an item count and, when asked for, the
+	# peak python heap for consecutive, non nested phases. Tracing the heap
+	# slows the measured phases down several times over. CPU time is process
+	# wide, so phases running worker threads include their work; a phase that
+	# streams subprocess output spends the difference of wall and cpu time
+	# waiting.
+	# A disabled timer hands out the same phase records without measuring.
+
+	def __init__(self, enabled = True, trace_memory = False):
+		self.__enabled = enabled
+		self.__trace_memory = enabled and trace_memory
+		self.__phases = []
+
+	def enabled(self):
+		return self.__enabled
+
+	def phases(self):
+		return self.__phases
+
+	@contextmanager
+	def phase(self, name):
+		phase = {'phase': name}
+		if not self.__enabled:
+			yield phase
+			return
+
+		if self.__trace_memory:
+			if not tracemalloc.is_tracing():
+				tracemalloc.start()
+			tracemalloc.reset_peak()
+			memory_before = tracemalloc.get_traced_memory()[0]
+		wall_start = time.perf_counter()
+		cpu_start = time.process_time()
+		try:
+			yield phase
+		finally:
+			phase['wall_seconds'] = round(time.perf_counter() - wall_start, 6)
+			phase['cpu_seconds'] = round(time.process_time() - cpu_start, 6)
+			if self.__trace_memory:
+				phase['peak_memory_bytes'] = max(0, tracemalloc.get_traced_memory()[1] - memory_before)
+			self.__phases.append(phase)
+
+	def stop(self):
+		if self.__trace_memory and tracemalloc.is_tracing():
+			tracemalloc.stop()
+
+	def write(self, output_file, extra = None):
+		# the phases as a json document, '-' writes to stderr
+		document = {}
+		if extra:
+			document.update(extra)
+		document['phases'] = self.__phases
+		document['wall_seconds'] = round(sum([p['wall_seconds'] for p in self.__phases]), 6)
+		document['cpu_seconds'] = round(sum([p['cpu_seconds'] for p in self.__phases]), 6)
+
+		if output_file == '-':
+			sys.stderr.write(json.dumps(document) + '\n')
+		else:
+			with open(output_file, 'w') as fout:
+				fout.write(json.dumps(document) + '\n')
@@ -0,0 +1,100 @@
+import os, sys, json, socket
+
+# the json line protocol of the unix socket servers, MergeDaemon and
+# HookWorker: the client sends one json line, the server answers with json
+# lines {"out": text} and {"err": text} while it works and ends with
+# {"exit": code}. Only the client side is imported eagerly, the hook client
+# loads nothing it does not need.
+
+def request(socket_path, message, stdout = None, stderr = None, stopped = None):
+	# sends a message and relays the answer; returns the exit code, or None
+	# when no server answered: none listens, or it went away before relaying
+	# anything. A server going away mid answer writes stopped and returns 1
+	stdout = stdout or sys.stdout
+	stderr = stderr or sys.stderr
+	if not os.path.exists(socket_path):
+		return None
+	try:
+		connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		connection.connect(socket_path)
+	except OSError:
+		return None
+
+	relayed = False
+	try:
+		connection.sendall((json.dumps(message) + '\n').encode('utf-8'))
+		for line in connection.makefile('r', encoding='utf-8'):
+			frame = json.loads(line)
+			if 'out' in frame:
+				stdout.write(frame['out'])
+				stdout.flush()
+				relayed = True
+			elif 'err' in frame:
+				stderr.write(frame['err'])
+				stderr.flush()
+				relayed = True
+			elif 'exit' in frame:
+				return frame['exit']
+	except (OSError, ValueError):
+		pass
+	finally:
+		connection.close()
+	if not relayed:
+		return None
+	# what was relayed cannot be taken back
+	if stopped:
+		stderr.write(stopped)
+	return 1
+
+def handler(handle):
+	# the request handler class of a socketserver, handle takes the message
+	# and the send function of the answer
+	import socketserver
+	class Handler(socketserver.StreamRequestHandler):
+		def handle(self):
+			wfile = self.wfile
+			def send(frame):
+				wfile.write((json.dumps(frame) + '\n').encode('utf-8'))
+				wfile.flush()
+			line = self.rfile.readline()
+			if len(line)<=0:
+				# a probe, it connected and went away
+				return
+			handle(json.loads(line.decode('utf-8')), send)
+	return Handler
+
+def answer(send, run, failed):
+	# runs run with its output sent as frames and ends the answer with its
+	# exit code; run returns the code, None for 0. An exception is reported
+	# with failed, a format taking its text
+	import contextlib
+	code = 0
+	out = FrameWriter(send, 'out')
+	err = FrameWriter(send, 'err')
+	try:
+		with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+			code = run() or 0
+	except BrokenPipeError:
+		# the client is gone, nobody to answer
+		return
+	except SystemExit as e:
+		code = e.code if isinstance(e.code, int) else 1
+	except Exception as e:
+		err.write(failed % str(e))
+		code = 1
+	send({'exit': code})
+
+
+class FrameWriter:
+	# a text stream sending every write as a frame of the answer
+	def __init__(self, send, stream):
+		self.__send = send
+		self.__stream = stream
+
+	def write(self, text):
+		if len(text)>0:
+			self.__send({self.__stream: text})
+		return len(text)
+
+	def flush(self):
+		pass
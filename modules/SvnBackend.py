@@ -0,0 +1,446 @@
+import os, subprocess, threading
+import xml.etree.ElementTree as ElementTree
+import modules.CommitModel as CommitModel
+import modules.SvnLog as SvnLog
+
+# the queries the scripts send to subversion: the log of a revision range,
+# the svn:mergeinfo of a working copy, the head revision and svnlook style
+# log messages and changed paths of a revision or transaction, whole or
+# line by line; plus merging
+# revision ranges into a working copy and listing its conflicts. Three
+# backends answer them: the svn command line tools, the subversion python
+# bindings and captured output replayed from files
+
+class SvnError(Exception):
+	# raised by every backend when a query cannot be answered
+	pass
+
+# set
+def create(backend = 'cli'):
+	# 'cli', 'bindings' or 'replay:<capture-folder>'
+	kind, separator, location = backend.partition(':')
+	if kind == 'cli':
+		return CliBackend()
+	if kind == 'bindings':
+		return BindingsBackend()
+	if kind == 'replay' and len(location) > 0:
+		return ReplayBackend(location)
+	raise SvnError('Unknown svn backend [' + backend + ']')
+
+def parseRange(svn_range, head):
+	# numeric bounds of a <revision>:<revision> range in the order given,
+	# head is a callable resolving HEAD; None when the range is not numeric
+	bounds = svn_range.split(':')
+	if len(bounds) != 2:
+		return None
+
+	revisions = []
+	for bound in bounds:
+		bound = bound.strip()
+		if bound.upper() == 'HEAD':
+			revision = head()
+			if revision is None:
+				return None
+			revisions.append(revision)
+		elif bound.isdigit():
+			revisions.append(int(bound))
+		else:
+			return None
+	return tuple(revisions)
+
+
+class CliBackend:
+	# runs svn and svnlook for every query and parses their output
+
+	def log(self, repo_path, svn_range, paths, log_format = 'xml', tickets = None, messages = None):
+		# yields the commits of the range in the order svn reports them,
+		# recording them in the TicketIndex tickets and their log messages in
+		# the dict messages when given
+		if log_format == 'text':
+			return iter(self.__textLog(repo_path, svn_range, paths, tickets, messages))
+		return self.__streamLog(repo_path, svn_range, paths, tickets, messages)
+
+	def headRevision(self, repo_path):
+		cmd_out = self.__run(['svn','info','--show-item','revision', repo_path])
+		try:
+			return int(cmd_out.decode('utf-8').strip())
+		except ValueError:
+			return None
+
+	def mergeInfo(self, local_path):
+		# the raw svn:mergeinfo property, empty when there is none
+		cmd = subprocess.Popen(['svn','propget','svn:mergeinfo', local_path], stdout=subprocess.PIPE)
+		return cmd.communicate()[0]
+
+	def look(self, repository, use_revision, operation_id, subcommand):
+		# svnlook log or svnlook changed output of a revision or transaction
+		cmd_args = ['svnlook', subcommand, repository, '-r' if use_revision else '-t', str(operation_id)]
+		return self.__run(cmd_args)
+
+	def lookLines(self, repository, use_revision, operation_id, subcommand):
+		# the lines of the svnlook output while it is received; svnlook is
+		# stopped when the caller stops reading
+		cmd_args = ['svnlook', subcommand, repository, '-r' if use_revision else '-t', str(operation_id)]
+		cmd = subprocess.Popen(cmd_args, stdout=subprocess.PIPE)
+
+		completed = False
+		try:
+			for line in cmd.stdout:
+				yield line
+			completed = True
+		finally:
+			if not completed:
+				cmd.kill()
+			cmd.stdout.close()
+			returncode = cmd.wait()
+
+		if returncode != 0:
+			raise SvnError('[' + ' '.join(cmd_args) + '] failed with exit code ' + str(returncode))
+
+	def merge(self, source_url, local_path, ranges):
+		# merges the -r start:end ranges in one call, conflicts are postponed
+		cmd_args = ['svn','merge','--non-interactive','--accept','postpone']
+		changes = [str(end) for start, end in ranges if end == start + 1]
+		if len(changes) == len(ranges):
+			cmd_args.extend(['-c', ','.join(changes)])
+		else:
+			for start, end in ranges:
+				cmd_args.extend(['-r', str(start) + ':' + str(end)])
+		cmd_args.extend([source_url, local_path])
+		self.__run(cmd_args)
+
+	def conflicts(self, local_path):
+		# the conflicted paths of a working copy: text, property or tree
+		conflicted = []
+		for line in self.__run(['svn','status','-q', local_path]).decode('utf-8').split('\n'):
+			if len(line) > 8 and 'C' in (line[0], line[1], line[6]):
+				conflicted.append(line[8:].strip())
+		return conflicted
+
+	def __run(self, cmd_args):
+		cmd = subprocess.Popen(cmd_args, stdout=subprocess.PIPE)
+		cmd_out, cmd_err = cmd.communicate()
+		if cmd.returncode != 0:
+			raise SvnError('[' + ' '.join(cmd_args) + '] failed with exit code ' + str(cmd.returncode))
+		return cmd_out
+
+	def __textLog(self, repo_path, svn_range, paths, tickets, messages):
+		cmd_out = self.__run(['svn','log','-v','-r' + svn_range, repo_path])
+		if len(cmd_out) <= 0:
+			return []
+		return SvnLog.parseLog(cmd_out, paths, tickets, messages)
+
+	def __streamLog(self, repo_path, svn_range, paths, tickets, messages):
+		# parses svn log --xml while it is received, only one entry is kept in memory
+		cmd_args = ['svn','log','--xml','-v','-r' + svn_range, repo_path]
+		cmd = subprocess.Popen(cmd_args, stdout=subprocess.PIPE)
+
+		completed = False
+		try:
+			for c in SvnLog.iterParseLog(cmd.stdout, paths, tickets, messages):
+				yield c
+			completed = True
+		except ElementTree.ParseError as e:
+			raise SvnError('The log of [' + svn_range + '] cannot be parsed: ' + str(e))
+		finally:
+			if not completed:
+				cmd.kill()
+			cmd.stdout.close()
+			returncode = cmd.wait()
+
+		if returncode != 0:
+			raise SvnError('[' + ' '.join(cmd_args) + '] failed with exit code ' + str(returncode))
+
+
+class BindingsBackend:
+	# answers the queries in process through the subversion python bindings,
+	# the log arrives as structured entries and is never rendered as text
+
+	def __init__(self):
+		try:
+			import svn.core, svn.client, svn.ra, svn.repos, svn.fs, svn.wc
+		except ImportError:
+			raise SvnError('The subversion python bindings are not installed')
+		self.__svn = svn
+		# a client context is not safe to share between threads
+		self.__lock = threading.Lock()
+		self.__context = None
+
+	def log(self, repo_path, svn_range, paths, log_format = 'xml', tickets = None, messages = None):
+		svn = self.__svn
+		# HEAD stays symbolic, svn resolves it
+		bounds = svn_range.split(':')
+		revision_range = svn.core.svn_opt_revision_range_t()
+		try:
+			revision_range.start = self.__revision(bounds[0].strip())
+			revision_range.end = self.__revision(bounds[-1].strip())
+		except ValueError:
+			raise SvnError('The range [' + svn_range + '] is not supported by the bindings backend')
+
+		commits = []
+		def receiver(log_entry, pool):
+			revprops = dict([(_text(key), value) for key, value in (log_entry.revprops or {}).items()])
+			changed_paths = log_entry.changed_paths2 or {}
+			changes = []
+			for path, change in changed_paths.items():
+				copy_path = _text(change.copyfrom_path) if change.copyfrom_path else None
+				changes.append((_text(path), _text(change.action), copy_path, change.copyfrom_rev))
+			message = _text(revprops.get('svn:log', ''))
+			if messages is not None:
+				messages[log_entry.revision] = message
+			message = message.strip()
+			op_number = 'unknown'
+			if len(message)>0:
+				op_number = SvnLog.parseOpNumber(message.split('\n', 1)[0].strip())
+			if tickets is not None:
+				tickets.add(op_number, log_entry.revision)
+			commits.append(CommitModel.Commit(
+				log_entry.revision,
+				_text(revprops.get('svn:author', '')),
+				_text(revprops.get('svn:date', '')),
+				op_number,
+				*paths.internChanges(changes)
+			))
+
+		with self.__lock:
+			try:
+				svn.client.log5(
+					[repo_path], self.__revision('HEAD'), [revision_range], 0,
+					True, False, False, ['svn:author', 'svn:date', 'svn:log'],
+					receiver, self.__clientContext()
+				)
+			except svn.core.SubversionException as e:
+				raise SvnError('The log of [' + svn_range + '] cannot be read: ' + str(e))
+		return iter(commits)
+
+	def headRevision(self, repo_path):
+		svn = self.__svn
+		with self.__lock:
+			try:
+				session = svn.client.open_ra_session(repo_path, self.__clientContext())
+				return svn.ra.get_latest_revnum(session)
+			except svn.core.SubversionException:
+				return None
+
+	def mergeInfo(self, local_path):
+		svn = self.__svn
+		with self.__lock:
+			try:
+				props = svn.client.propget3(
+					'svn:mergeinfo', local_path,
+					self.__revision(None), self.__revision('WORKING'),
+					svn.core.svn_depth_empty, None, self.__clientContext()
+				)
+			except svn.core.SubversionException:
+				return b''
+		# the property values of the target, some binding versions add the
+		# actual revision
+		if isinstance(props, tuple):
+			props = props[0]
+		for value in (props or {}).values():
+			return _bytes(value)
+		return b''
+
+	def look(self, repository, use_revision, operation_id, subcommand):
+		# renders the answer the way svnlook would, the hook parses both alike
+		svn = self.__svn
+		try:
+			fs = svn.repos.fs(svn.repos.open(repository))
+			if use_revision:
+				revision = int(operation_id)
+				root = svn.fs.revision_root(fs, revision)
+				message = svn.fs.revision_prop(fs, revision, 'svn:log')
+			else:
+				txn = svn.fs.open_txn(fs, operation_id)
+				root = svn.fs.txn_root(txn)
+				message = svn.fs.txn_prop(txn, 'svn:log')
+
+			if subcommand == 'log':
+				return _bytes(message or '') + b'\n'
+
+			actions = {
+				svn.fs.path_change_add: 'A',
+				svn.fs.path_change_delete: 'D',
+				svn.fs.path_change_replace: 'R',
+				svn.fs.path_change_modify: 'U'
+			}
+			lines = []
+			for path, change in sorted(svn.fs.paths_changed(root).items()):
+				lines.append(actions.get(change.change_kind, 'U') + '   ' + _text(path).lstrip('/') + '\n')
+			return ''.join(lines).encode('utf-8')
+		except svn.core.SubversionException as e:
+			raise SvnError('svnlook ' + subcommand + ' of [' + str(operation_id) + '] failed: ' + str(e))
+
+	def lookLines(self, repository, use_revision, operation_id, subcommand):
+		# the bindings hand over the changed paths at once, they are rendered
+		# in one go as well
+		return iter(self.look(repository, use_revision, operation_id, subcommand).splitlines(True))
+
+	def merge(self, source_url, local_path, ranges):
+		svn = self.__svn
+		revision_ranges = []
+		for start, end in ranges:
+			revision_range = svn.core.svn_opt_revision_range_t()
+			revision_range.start = self.__revision(start)
+			revision_range.end = self.__revision(end)
+			revision_ranges.append(revision_range)
+
+		with self.__lock:
+			try:
+				svn.client.merge_peg3(
+					source_url, revision_ranges, self.__revision('HEAD'), local_path,
+					svn.core.svn_depth_infinity, False, False, False, False, None,
+					self.__clientContext()
+				)
+			except svn.core.SubversionException as e:
+				raise SvnError('Merging into [' + local_path + '] failed: ' + str(e))
+
+	def conflicts(self, local_path):
+		svn = self.__svn
+		conflicted = []
+		def receiver(path, status):
+			if status.text_status == svn.wc.svn_wc_status_conflicted \
+					or status.prop_status == svn.wc.svn_wc_status_conflicted \
+					or status.tree_conflict is not None:
+				conflicted.append(_text(path))
+
+		with self.__lock:
+			try:
+				svn.client.status4(
+					local_path, self.__revision('WORKING'), receiver,
+					svn.core.svn_depth_infinity, False, False, False, True, None,
+					self.__clientContext()
+				)
+			except svn.core.SubversionException as e:
+				raise SvnError('The status of [' + local_path + '] cannot be read: ' + str(e))
+		return conflicted
+
+	def __clientContext(self):
+		svn = self.__svn
+		if self.__context is None:
+			context = svn.client.create_context()
+			context.auth_baton = svn.core.svn_auth_open([
+				svn.client.get_simple_provider(),
+				svn.client.get_username_provider(),
+				svn.client.get_ssl_server_trust_file_provider(),
+				svn.client.get_ssl_client_cert_file_provider(),
+				svn.client.get_ssl_client_cert_pw_file_provider()
+			])
+			context.config = svn.core.svn_config_get_config(None)
+			self.__context = context
+		return self.__context
+
+	def __revision(self, revision):
+		svn = self.__svn
+		opt_revision = svn.core.svn_opt_revision_t()
+		if revision is None:
+			opt_revision.kind = svn.core.svn_opt_revision_unspecified
+		elif str(revision).upper() == 'HEAD':
+			opt_revision.kind = svn.core.svn_opt_revision_head
+		elif str(revision).upper() == 'WORKING':
+			opt_revision.kind = svn.core.svn_opt_revision_working
+		else:
+			opt_revision.kind = svn.core.svn_opt_revision_number
+			opt_revision.value.number = int(revision)
+		return opt_revision
+
+
+class ReplayBackend:
+	# answers the queries from captured output in a folder, no server needed:
+	#   log.xml        svn log --xml -v of the whole range (or log.txt, svn log -v)
+	#   mergeinfo.txt  svn propget svn:mergeinfo of the working copy
+	#   head.txt       svn info --show-item revision, else the newest logged revision
+	#   look/<revision or transaction>.log and .changed   svnlook output
+
+	def __init__(self, folder):
+		if not os.path.isdir(folder):
+			raise SvnError('The replay folder [' + folder + '] does not exist')
+		self.__folder = folder
+		self.__lock = threading.Lock()
+		self.__commits = None
+		self.__messages = {}
+
+	def log(self, repo_path, svn_range, paths, log_format = 'xml', tickets = None, messages = None):
+		# the captured commits of the range, in the order of the range bounds
+		captured = self.__loadCommits(paths)
+		bounds = parseRange(svn_range, lambda: self.headRevision(repo_path))
+		if bounds is None:
+			raise SvnError('The range [' + svn_range + '] cannot be replayed')
+		low, high = min(bounds), max(bounds)
+		commits = [c for c in captured if low <= c.revision <= high]
+		commits.sort(key=lambda c: c.revision, reverse=bounds[0] > bounds[1])
+		if tickets is not None:
+			for c in commits:
+				tickets.add(c.opnumber, c.revision)
+		if messages is not None:
+			for c in commits:
+				messages[c.revision] = self.__messages.get(c.revision, '')
+		return iter(commits)
+
+	def headRevision(self, repo_path):
+		head = self.__read('head.txt', None)
+		if head is not None:
+			try:
+				return int(head.decode('utf-8').strip())
+			except ValueError:
+				return None
+		commits = self.__commits or []
+		if len(commits) <= 0:
+			return None
+		return max([c.revision for c in commits])
+
+	def mergeInfo(self, local_path):
+		return self.__read('mergeinfo.txt', b'')
+
+	def merge(self, source_url, local_path, ranges):
+		raise SvnError('The replay backend cannot merge')
+
+	def conflicts(self, local_path):
+		return []
+
+	def look(self, repository, use_revision, operation_id, subcommand):
+		captured = self.__read(os.path.join('look', str(operation_id) + '.' + subcommand), None)
+		if captured is None:
+			raise SvnError('No captured svnlook ' + subcommand + ' of [' + str(operation_id) + ']')
+		return captured
+
+	def lookLines(self, repository, use_revision, operation_id, subcommand):
+		file_path = os.path.join(self.__folder, 'look', str(operation_id) + '.' + subcommand)
+		if not os.path.isfile(file_path):
+			raise SvnError('No captured svnlook ' + subcommand + ' of [' + str(operation_id) + ']')
+		with open(file_path, 'rb') as fin:
+			for line in fin:
+				yield line
+
+	def __loadCommits(self, paths):
+		# the capture is parsed once, the first time it is asked for
+		with self.__lock:
+			if self.__commits is None:
+				log_xml = os.path.join(self.__folder, 'log.xml')
+				try:
+					if os.path.isfile(log_xml):
+						with open(log_xml, 'rb') as fin:
+							self.__commits = list(SvnLog.iterParseLog(fin, paths, None, self.__messages))
+					else:
+						self.__commits = SvnLog.parseLog(self.__read('log.txt', b''), paths, None, self.__messages)
+				except ElementTree.ParseError as e:
+					raise SvnError('The captured log cannot be parsed: ' + str(e))
+			return self.__commits
+
+	def __read(self, file_name, default):
+		file_path = os.path.join(self.__folder, file_name)
+		if not os.path.isfile(file_path):
+			return default
+		with open(file_path, 'rb') as fin:
+			return fin.read()
+
+
+def _text(value):
+	if isinstance(value, bytes):
+		return value.decode('utf-8')
+	return value
+
+def _bytes(value):
+	if isinstance(value, bytes):
+		return value
+	return value.encode('utf-8')
@@ -0,0 +1,248 @@
+import re, bisect, array
+import xml.etree.ElementTree as ElementTree
+import modules.CommitModel as CommitModel
+
+# parsing of svn log and svn:mergeinfo output into the commit model,
+# independent of how the output was obtained
+
+# the copy source closing a changed path of plain svn log -v output
+COPY_SOURCE = re.compile(r' \(from (.+):(\d+)\)$')
+
+# merged runs shorter than this are fetched along with the gaps around
+# them, another svn log call costs more than the revisions
+GAP_MIN_SKIP = 100
+
+def parseLog(svn_str, paths, tickets = None, messages = None):
+	# the commits of plain svn log -v output; tickets, when given, is the
+	# TicketIndex the commits are recorded in, messages a dict receiving the
+	# log message of every revision
+	commits = []
+
+	svn_log_output = re.sub(r'(\-{10,})([\n\r]+)', "BREAK\n\n", svn_str.decode('utf-8'))
+	svn_log_lines = svn_log_output.split("BREAK\n\n")
+
+	if len(svn_log_lines) <= 0:
+		return commits;
+
+	for svn_log_line in svn_log_lines:
+		tmp = svn_log_line.strip()
+		if (len(tmp) > 0):
+			commits.append(parseLogData(tmp, paths, tickets, messages))
+
+	return commits
+
+def parseLogData(log_data, paths, tickets = None, messages = None):
+	log_data_lines = log_data.split('\n')
+
+	revision = 0
+	user = ''
+	timestamp = ''
+	tmp = log_data_lines[0].strip().split("|")
+
+	for i,val in enumerate(tmp):
+		val = val.strip()
+		if (i == 0):
+			revision = int(val[1:])
+		if (i == 1):
+			user = val
+		if (i == 2):
+			timestamp = val
+
+	changes = []
+	op_number = 'unknown'
+
+	rest = log_data_lines[1:]
+	comment_pending = False
+
+	for line_number, line in enumerate(rest):
+		line_entry = line.strip();
+
+		if (len(line_entry)==0):
+			comment_pending = True
+		elif comment_pending:
+			# the task is referenced on the first line of the message
+			op_number = parseOpNumber(line_entry)
+			if messages is not None:
+				messages[revision] = '\n'.join(rest[line_number:])
+			break
+		else:
+			if line_entry.startswith(('A ', 'D ', 'U ', 'M ', 'G ', 'E ', 'R ')):
+				file_path = line_entry[2:].strip()
+				copy_path = None
+				copy_revision = None
+				if file_path.endswith(')'):
+					copy_source = COPY_SOURCE.search(file_path)
+					if copy_source:
+						file_path = file_path[:copy_source.start()]
+						copy_path, copy_revision = copy_source.groups()
+				changes.append((file_path, line_entry[0], copy_path, copy_revision))
+
+	if tickets is not None:
+		tickets.add(op_number, revision)
+	if messages is not None:
+		messages.setdefault(revision, '')
+	return CommitModel.Commit(revision, user, timestamp, op_number, *paths.internChanges(changes))
+
+def iterParseLog(stream, paths, tickets = None, messages = None):
+	# yields the commits of svn log --xml -v output while it is read from the
+	# stream, only the entry being parsed is kept in memory
+	root = None
+	for event, element in ElementTree.iterparse(stream, events=('start', 'end')):
+		if event == 'start':
+			if root is None:
+				root = element
+			continue
+		if element.tag == 'logentry':
+			yield parseLogEntry(element, paths, tickets, messages)
+			root.clear()
+
+def parseLogEntry(log_entry, paths, tickets = None, messages = None):
+	revision = int(log_entry.get('revision'))
+	user = log_entry.findtext('author', '')
+	timestamp = log_entry.findtext('date', '')
+
+	changes = []
+	for path in log_entry.iterfind('paths/path'):
+		changes.append((path.text.strip(), path.get('action', 'M'), path.get('copyfrom-path'), path.get('copyfrom-rev')))
+
+	# the task is referenced on the first line of the message
+	op_number = 'unknown'
+	comment = log_entry.findtext('msg', '')
+	if messages is not None:
+		messages[revision] = comment
+	comment = comment.strip()
+	if len(comment)>0:
+		op_number = parseOpNumber(comment.split('\n', 1)[0].strip())
+
+	if tickets is not None:
+		tickets.add(op_number, revision)
+	return CommitModel.Commit(revision, user, timestamp, op_number, *paths.internChanges(changes))
+
+def parseOpNumber(line_entry):
+	line_search = re.search('\[.*\]\s*\(\s*(OP\s*\d+)\){1}', line_entry, re.IGNORECASE)
+	if line_search:
+		op_number = line_search.group(1)
+		return re.sub('\s*OP\s*', "#", op_number)
+
+	line_search = re.search('\[.*\]\s*\(\s*(\w+)\){1}', line_entry, re.IGNORECASE)
+	if line_search:
+		return line_search.group(1)
+	return 'unknown'
+
+def normalizeTicket(ticket):
+	# a task as the log parsing reports it: OP 1234 -> #1234, aspects as given
+	ticket = ticket.strip()
+	ticket_search = re.match('^(?:OP|#)\s*(\d+)$', ticket, re.IGNORECASE)
+	if ticket_search:
+		return '#' + ticket_search.group(1)
+	return ticket
+
+def parseMergeInfo(merge_info):
+	# source path -> merged revision ranges as sorted, coalesced parallel
+	# arrays; ranges['from'][i]..ranges['to'][i] are merged, inclusive
+	merges = {};
+
+	merge_info_lines = merge_info.decode('utf-8').split('\n')
+
+	if len(merge_info_lines)<=0:
+		return merges;
+
+	revision_items = {}
+	for info_line in merge_info_lines:
+		merge_source_path, separator, merge_revisions_combined = info_line.rpartition(':')
+		if len(separator)<=0:
+			continue
+
+		merge_source_path = merge_source_path.strip()
+		merge_item = revision_items.setdefault(merge_source_path, [])
+
+		for revision in merge_revisions_combined.split(','):
+			# a trailing '*' marks a non-inheritable range, it is merged into the
+			# target itself which is all that matters here
+			revision = revision.strip().rstrip('*')
+			if len(revision)<=0:
+				continue
+			revision_range = revision.split('-')
+			revision_from = int(revision_range[0].strip())
+			revision_to = int(revision_range[-1].strip())
+			merge_item.append((revision_from, revision_to))
+
+	for merge_source_path in revision_items:
+		merges[merge_source_path] = coalesceRanges(revision_items[merge_source_path])
+
+	return merges
+
+def coalesceRanges(revision_items):
+	ranges = {}
+	ranges['from'] = array.array('l')
+	ranges['to'] = array.array('l')
+
+	for revision_from, revision_to in sorted(revision_items):
+		if len(ranges['to'])>0 and revision_from <= ranges['to'][-1]+1:
+			ranges['to'][-1] = max(ranges['to'][-1], revision_to)
+		else:
+			ranges['from'].append(revision_from)
+			ranges['to'].append(revision_to)
+
+	return ranges
+
+def isMerged(ranges, revision):
+	position = bisect.bisect_left(ranges['to'], revision)
+	return position < len(ranges['from']) and ranges['from'][position] <= revision
+
+def unmergedGaps(ranges, start, end, min_skip = GAP_MIN_SKIP):
+	# the sub ranges of start..end outside the merged ranges, as (start, end)
+	# inclusive; merged runs shorter than min_skip are bridged
+	gaps = []
+	next_revision = start
+	for merged_from, merged_to in zip(ranges['from'], ranges['to']):
+		if merged_to < next_revision:
+			continue
+		if merged_from > end:
+			break
+		if merged_from > next_revision:
+			if len(gaps)>0 and next_revision - gaps[-1][1] - 1 < min_skip:
+				gaps[-1][1] = merged_from - 1
+			else:
+				gaps.append([next_revision, merged_from - 1])
+		next_revision = merged_to + 1
+	if next_revision <= end:
+		if len(gaps)>0 and next_revision - gaps[-1][1] - 1 < min_skip:
+			gaps[-1][1] = end
+		else:
+			gaps.append([next_revision, end])
+	return [(gap_start, gap_end) for gap_start, gap_end in gaps]
+
+def positionCommits(commits):
+	# revision -> position in commits
+	positions = {}
+	for position, c in enumerate(commits):
+		positions[c.revision] = position
+	return positions
+
+def filterMerged(commits, ranges):
+	# merge join of the commits against the merged ranges, both ascending;
+	# falls back to a bisect lookup whenever the commits step backwards.
+	# returns the unmerged commits and their revision -> position map
+	unmerged = []
+	positions = {}
+	range_from = ranges['from']
+	range_to = ranges['to']
+	range_count = len(range_from)
+
+	position = 0
+	last_revision = None
+	for c in commits:
+		rev = c.revision
+		if last_revision is not None and rev < last_revision:
+			position = bisect.bisect_left(range_to, rev)
+		last_revision = rev
+
+		while position < range_count and range_to[position] < rev:
+			position = position + 1
+		if position < range_count and range_from[position] <= rev:
+			continue
+		positions[rev] = len(unmerged)
+		unmerged.append(c)
+
+	return unmerged, positions
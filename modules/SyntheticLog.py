@@ -0,0 +1,156 @@
+import random, itertools, datetime
+from xml.sax.saxutils import escape
+
+# synthetic svn history for offline benchmarks: renders svn log -v, svn log
+# --xml -v and svn:mergeinfo output shaped like a long lived ticket based trunk
+
+DEFAULTS = {
+	'trunk': '/trunk/project',
+	'first_revision': 1000,
+	'revisions': 20000,
+	# distinct files, by default a quarter of the revisions
+	'files': 0,
+	# mean number of files a regular commit touches
+	'files_per_commit': 3,
+	# zipf exponent of the file popularity, 0 touches all files evenly
+	'hot_file_skew': 1.1,
+	# share of commits that are large refactors touching hundreds of files
+	'refactor_rate': 0.001,
+	'commits_per_ticket': 6,
+	# standard deviation, in tickets, of how far a commit strays from the
+	# tickets currently being worked on
+	'ticket_spread': 20,
+	# share of the revisions already merged and in how many fragments
+	'merged_fraction': 0.6,
+	'mergeinfo_fragments': 500,
+	'seed': 1
+}
+
+# set
+def create(settings = None):
+	return SyntheticLog(settings)
+
+
+class SyntheticLog:
+	def __init__(self, settings = None):
+		self.__settings = dict(DEFAULTS)
+		if settings:
+			self.__settings.update(settings)
+		self.__random = random.Random(self.__settings['seed'])
+		self.__commits = self.__generateCommits()
+
+	def revisions(self):
+		return [c[0] for c in self.__commits]
+
+	def logText(self):
+		# svn log -v output, oldest revision first
+		separator = '-' * 72
+		out = []
+		for revision, author, date, paths, message in self.__commits:
+			message_lines = message.count('\n') + 1
+			out.append(separator)
+			out.append(
+				'r' + str(revision) + ' | ' + author + ' | '
+				+ date.strftime('%Y-%m-%d %H:%M:%S +0000 (%a, %d %b %Y)')
+				+ ' | ' + str(message_lines) + (' line' if message_lines == 1 else ' lines')
+			)
+			out.append('Changed paths:')
+			for action, path in paths:
+				out.append('   ' + action + ' ' + path)
+			out.append('')
+			out.append(message)
+		out.append(separator)
+		out.append('')
+		return '\n'.join(out).encode('utf-8')
+
+	def logXml(self):
+		# svn log --xml -v output, oldest revision first
+		out = ['<?xml version="1.0" encoding="UTF-8"?>', '<log>']
+		for revision, author, date, paths, message in self.__commits:
+			out.append('<logentry\n   revision="' + str(revision) + '">')
+			out.append('<author>' + escape(author) + '</author>')
+			out.append('<date>' + date.strftime('%Y-%m-%dT%H:%M:%S.000000Z') + '</date>')
+			out.append('<paths>')
+			for action, path in paths:
+				out.append('<path\n   action="' + action + '"\n   kind="file">' + escape(path) + '</path>')
+			out.append('</paths>')
+			out.append('<msg>' + escape(message) + '</msg>')
+			out.append('</logentry>')
+		out.append('</log>')
+		out.append('')
+		return '\n'.join(out).encode('utf-8')
+
+	def mergeInfo(self):
+		# svn propget svn:mergeinfo output of a branch, the trunk fragments are
+		# cherry picked ranges over the whole history, some non-inheritable
+		settings = self.__settings
+		rnd = self.__random
+		first = settings['first_revision']
+		last = first + settings['revisions'] - 1
+
+		fragments = max(1, settings['mergeinfo_fragments'])
+		fragment_length = max(1, int(settings['revisions'] * settings['merged_fraction'] / fragments))
+		starts = sorted(rnd.sample(range(first, last+1), min(fragments, settings['revisions'])))
+
+		ranges = []
+		for start in starts:
+			end = min(last, start + max(0, int(rnd.expovariate(1.0 / fragment_length)) - 1))
+			fragment = str(start) if end == start else str(start) + '-' + str(end)
+			if rnd.random() < 0.02:
+				fragment = fragment + '*'
+			ranges.append(fragment)
+
+		lines = [
+			settings['trunk'] + ':' + ','.join(ranges),
+			'/branches/feature-x:' + str(first) + '-' + str(first + 10),
+			''
+		]
+		return '\n'.join(lines).encode('utf-8')
+
+	def __generateCommits(self):
+		settings = self.__settings
+		rnd = self.__random
+
+		file_count = settings['files'] if settings['files'] > 0 else max(10, settings['revisions'] // 4)
+		files = []
+		for i in range(file_count):
+			files.append(
+				settings['trunk'] + '/src/module' + str(i % 40).zfill(2)
+				+ '/package' + str((i // 40) % 25).zfill(2)
+				+ '/Class' + str(i).zfill(6) + '.java'
+			)
+		rnd.shuffle(files)
+		weights = [1.0 / ((rank + 1) ** settings['hot_file_skew']) for rank in range(file_count)]
+		cum_weights = list(itertools.accumulate(weights))
+
+		authors = ['developer' + str(i).zfill(2) for i in range(25)]
+		aspects = ['build', 'version', 'definition', 'platform', 'plugin']
+		date = datetime.datetime(2015, 1, 1)
+
+		commits = []
+		for i in range(settings['revisions']):
+			revision = settings['first_revision'] + i
+			date = date + datetime.timedelta(seconds=rnd.randint(30, 7200))
+
+			if rnd.random() < settings['refactor_rate']:
+				count = rnd.randint(min(200, file_count), min(2000, file_count))
+			elif settings['files_per_commit'] > 1:
+				count = 1 + int(rnd.expovariate(1.0 / (settings['files_per_commit'] - 1)))
+			else:
+				count = 1
+			chosen = sorted(set(rnd.choices(files, cum_weights=cum_weights, k=min(count, file_count))))
+			paths = [('A' if rnd.random() < 0.05 else 'M', path) for path in chosen]
+
+			reference = chosen[0].rsplit('/', 1)[-1]
+			if rnd.random() < 0.05:
+				task = rnd.choice(aspects)
+			else:
+				current = i // max(1, settings['commits_per_ticket'])
+				task = 'OP' + str(1000 + max(0, int(rnd.gauss(current, settings['ticket_spread']))))
+			message = '[' + reference + '](' + task + ') synthetic change ' + str(revision)
+			if rnd.random() < 0.3:
+				message = message + '\n\nfollow up details\nmore details'
+
+			commits.append((revision, rnd.choice(authors), date, paths, message))
+
+		return commits
@@ -0,0 +1,94 @@
+import os, re, mmap, struct
+
+# the tickets commits may reference, as a snapshot a cron job refreshes from
+# the tracker; the hook never asks the tracker itself. The snapshot is the
+# magic followed by the sorted ticket numbers as 8 byte big endian records.
+# It is mapped, not read, and searched in place in O(log n); a refreshed
+# snapshot is written aside and renamed over the old one, a registry notices
+# the new file at its next lookup.
+
+MAGIC = b'SVNTICK1'
+RECORD = struct.Struct('>Q')
+
+# a ticket as the tracker export lists it: OP 1234, OP1234, #1234 or 1234
+TICKET = re.compile(r'^\s*(?:OP\s*|#)?(\d+)\s*$', re.IGNORECASE)
+
+class RegistryError(Exception):
+	# the snapshot is missing or not a snapshot
+	pass
+
+# set
+def create(snapshot_path):
+	return TicketRegistry(snapshot_path)
+
+def write(snapshot_path, tickets):
+	# tickets are ticket numbers, duplicates allowed; returns how many were written
+	records = sorted(set([int(ticket) for ticket in tickets]))
+	with open(snapshot_path + '.tmp', 'wb') as fout:
+		fout.write(MAGIC)
+		for ticket in records:
+			fout.write(RECORD.pack(ticket))
+	os.replace(snapshot_path + '.tmp', snapshot_path)
+	return len(records)
+
+def parseTickets(lines):
+	# the ticket numbers of an export, one ticket a line; other lines are skipped
+	for line in lines:
+		ticket = TICKET.match(line)
+		if ticket:
+			yield int(ticket.group(1))
+
+
+class TicketRegistry:
+	def __init__(self, snapshot_path):
+		self.__snapshot_path = snapshot_path
+		self.__identity = None
+		self.__map = None
+		self.__count = 0
+
+	def __len__(self):
+		self.__refresh()
+		return self.__count
+
+	def __contains__(self, ticket):
+		self.__refresh()
+		records = self.__map
+		low, high = 0, self.__count
+		while low < high:
+			middle = (low + high) >> 1
+			record = RECORD.unpack_from(records, len(MAGIC) + middle * RECORD.size)[0]
+			if record < ticket:
+				low = middle + 1
+			elif record > ticket:
+				high = middle
+			else:
+				return True
+		return False
+
+	def close(self):
+		if self.__map is not None:
+			self.__map.close()
+		self.__map = None
+		self.__identity = None
+
+	def __refresh(self):
+		# one stat per lookup, the snapshot is mapped again once it was replaced
+		try:
+			stat = os.stat(self.__snapshot_path)
+		except OSError as e:
+			raise RegistryError('The ticket registry [' + self.__snapshot_path + '] cannot be read: ' + str(e))
+		identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+		if identity == self.__identity:
+			return
+
+		self.close()
+		if stat.st_size < len(MAGIC):
+			raise RegistryError('[' + self.__snapshot_path + '] is not a ticket registry snapshot')
+		with open(self.__snapshot_path, 'rb') as fin:
+			records = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+		if records[:len(MAGIC)] != MAGIC or (len(records) - len(MAGIC)) % RECORD.size != 0:
+			records.close()
+			raise RegistryError('[' + self.__snapshot_path + '] is not a ticket registry snapshot')
+		self.__map = records
+		self.__count = (len(records) - len(MAGIC)) // RECORD.size
+		self.__identity = identity
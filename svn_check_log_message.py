@@ -1,15 +1,33 @@
-from subprocess import Popen
-from subprocess import PIPE
 from optparse import OptionParser
 import sys
+import hashlib
 import re
 import os
+import modules.SvnBackend as SvnBackend
+import modules.HookWorker as HookWorker
+import modules.TicketRegistry as TicketRegistry
+import modules.LogAudit as LogAudit
+
+# compiled once, every commit runs through them while it is blocked
+LOG_REFERENCE = re.compile('^\[(.*)\]', re.IGNORECASE)
+PROJECT_REFERENCE = re.compile('^\[.*\]\(([\w|\s]*)\)', re.IGNORECASE)
+PROJECT_TICKET = re.compile('OP(\s*)(\d\d\d\d+)', re.IGNORECASE)
+
+# modified files listed when none of them is referenced
+REFERENCABLE_SAMPLE = 20
+
+# aspects a commit may reference instead of a ticket
+PROJECT_ASPECTS = ('definition', 'version', 'plugin', 'platform', 'build')
+
+# tried in order; nearly every message is utf-8 and decodes at the first
+# attempt, latin_1 decodes anything
+DECODINGS = ("utf-8", "windows-1252", "iso8859_15", "latin_1")
 	
-def decode_output(input, codecs=["utf-8", "windows-1252", "iso8859_15", "latin_1", "ascii"]):
+def decode_output(input, codecs=DECODINGS):
 	for codec in codecs:
 		try:
 			return input.decode(codec)
-		except:
+		except UnicodeDecodeError:
 			pass
 		
 	# set to empty, the check will fail with empty message error
@@ -19,51 +37,50 @@ def decode_output(input, codecs=["utf-8", "windows-1252", "iso8859_15", "latin_1
 	sys.stderr.write("ISO-8859-15, ISO-8859-1 and ASCII\n")
 	return ""
 
-def command_output(cmd):
-    return Popen(cmd.split(), stdout=PIPE).communicate()[0]
-
 def get_log_message(look_cmd):
-	return decode_output(command_output(look_cmd % ("log")))
+	return decode_output(look_cmd("log"))
 
 def get_log_reference(log_message):
-	reference_search = re.search('^\[(.*)\]',log_message, re.IGNORECASE)
+	reference_search = LOG_REFERENCE.search(log_message)
 	if reference_search:
 		reference = reference_search.group(1)		
 		return reference
 	return ""
 
 def get_project_reference(log_message):
-	reference_search = re.search('^\[.*\]\(([\w|\s]*)\)', log_message, re.IGNORECASE)
+	reference_search = PROJECT_REFERENCE.search(log_message)
 	if reference_search:
 		reference = reference_search.group(1)
 		return reference
 	return ""
 
 def get_changed_files(look_cmd):
-	def filename(line):
-		return line[4:-1]
-	output = decode_output(command_output(look_cmd % ("changed")))
-	file_list = output.split("\n")
-	changed_files = [filename(line) for line in file_list if len(line)>0]
-	return changed_files
+	return list(iter_changed_files(look_cmd))
+
+def iter_changed_files(look_cmd):
+	# the changed paths while svnlook lists them, one line decoded at a time
+	for line in look_cmd("changed", True):
+		try:
+			line = line.decode("utf-8")
+		except UnicodeDecodeError:
+			line = decode_output(line)
+		line = line.rstrip("\r\n")
+		if len(line)>0:
+			yield line[4:]
 	
 def remove_extension(filename_with_extension):
 		filename, extension = os.path.splitext(filename_with_extension)
 		return filename
 	
+def basename(file_path):
+	# the last component without extension, of a directory path the directory
+	parent, separator, component = file_path.rpartition("/")
+	if len(component)<=0:
+		component = parent.rpartition("/")[2]
+	return remove_extension(component)
+
 def basenames(file_list):
-	def last_component(file_path):
-		path_components = file_path.split("/")
-		if len(path_components)>0:
-			component = path_components[-1]
-			if len(component)>0:
-				return component
-			elif len(path_components)>1:
-				return path_components[-2]
-		return "";	
-	basenames = [last_component(file_path) for file_path in file_list]
-	basenames = [remove_extension(file_path) for file_path in basenames]
-	return basenames
+	return [basename(file_path) for file_path in file_list]
 	
 def get_normed_reference(log_reference):
 	lc_log_reference = log_reference.lower()
@@ -79,82 +96,193 @@ def check_project_reference(project_reference):
 	if len(project_reference)<=0:
 		return False
 
-	lc_project_reference = project_reference.lower();
-	if lc_project_reference == 'definition' or lc_project_reference == 'version':
-		return True
-	if lc_project_reference == 'plugin' or lc_project_reference == 'platform' or lc_project_reference == 'build':
+	if project_reference.lower() in PROJECT_ASPECTS:
 		return True
 
-	if (re.match('OP(\s*)\d\d\d\d+', project_reference, re.IGNORECASE) == None):
+	if (PROJECT_TICKET.match(project_reference) == None):
 		return False
 
 	return True;
 
+def check_ticket_registered(project_reference, registry):
+	# aspects are not tickets, they are always valid
+	ticket = PROJECT_TICKET.match(project_reference)
+	if ticket is None:
+		return True
+	return int(ticket.group(2)) in registry
+
 def check_referencable_referenced(referencables, log_reference):
 	lc_log_reference = get_normed_reference(log_reference)
-	lc_referencables = [reference.lower() for reference in referencables]
-	for referencable in lc_referencables:
-		if lc_log_reference in referencable:
+	# referencables may be streamed, the first one referenced ends the scan
+	for referencable in referencables:
+		if lc_log_reference in referencable.lower():
 			return True
 	return False
 
-def check_valid_commit(look_cmd, log_message) :
-	if not check_log_message(log_message):
-		sys.stderr.write("[ERROR] Empty commit messages are not allowed")
-		return False
+# the validation pipeline: every stage checks the commit, records what the
+# later stages need in it and returns an error or None. The stages on the
+# message come first, a rejected message never waits for svnlook changed
+def stage_log_message(commit, look_cmd):
+	if not check_log_message(commit['log_message']):
+		return "[ERROR] Empty commit messages are not allowed"
+	return None
 
-	log_reference = get_log_reference(log_message)
-	if not check_log_reference(log_reference):
-		sys.stderr.write("[ERROR] Commit message does not contain a commit reference => [main-modification-file] ...")
-		return False
+def stage_log_reference(commit, look_cmd):
+	commit['log_reference'] = get_log_reference(commit['log_message'])
+	if not check_log_reference(commit['log_reference']):
+		return "[ERROR] Commit message does not contain a commit reference => [main-modification-file] ..."
+	return None
 
-	project_reference = get_project_reference(log_message)
+def stage_project_reference(commit, look_cmd):
+	project_reference = get_project_reference(commit['log_message'])
 	if not check_project_reference(project_reference):
-		sys.stderr.write("[ERROR] Commit message does not reference aspect (definition|version|plugin|platform|build) or a project ticket => [main-modification-file](<ticket-number>) ...")
-		return False
+		return "[ERROR] Commit message does not reference aspect (definition|version|plugin|platform|build) or a project ticket => [main-modification-file](<ticket-number>) ..."
+	registry = commit.get('registry')
+	if registry is not None:
+		try:
+			if not check_ticket_registered(project_reference, registry):
+				return "[ERROR] Commit message references ticket [%s] which is not an open ticket of the tracker" % project_reference.strip()
+		except TicketRegistry.RegistryError as e:
+			# a broken snapshot does not block every commit
+			sys.stderr.write("[WARN] %s, the ticket is not verified\n" % str(e))
+	return None
 
-	changed_files = get_changed_files(look_cmd)
-	if len(changed_files) != 0:
-		referencables= basenames(changed_files)
-		if not check_referencable_referenced(referencables, log_reference):
-			sys.stderr.write("[ERROR] Commit message reference [%s] not contained in modified files %s" % (log_reference,str(referencables)))
-			return False
-	else:
+def stage_changed_files(commit, look_cmd):
+	# the files are streamed, a huge changeset is never held; the error shows
+	# the first few of them
+	sample = []
+	count = 0
+	def referencables():
+		nonlocal count
+		for file_path in iter_changed_files(look_cmd):
+			referencable = basename(file_path)
+			if count < REFERENCABLE_SAMPLE:
+				sample.append(referencable)
+			count += 1
+			yield referencable
+
+	if check_referencable_referenced(referencables(), commit['log_reference']):
+		return None
+	if count <= 0:
 		sys.stdout.write("[PRE-COMMIT PASSTHROUGH] No modified files were detected")
-	
+		return None
+	if count > len(sample):
+		return "[ERROR] Commit message reference [%s] not contained in modified files %s and %d more" % (commit['log_reference'], str(sample), count - len(sample))
+	return "[ERROR] Commit message reference [%s] not contained in modified files %s" % (commit['log_reference'], str(sample))
+
+PIPELINE = (stage_log_message, stage_log_reference, stage_project_reference, stage_changed_files)
+
+def validate_commit(look_cmd, log_message, registry=None):
+	# the error of the first stage rejecting the commit, None when it passes
+	commit = {'log_message': log_message, 'registry': registry}
+	for stage in PIPELINE:
+		error = stage(commit, look_cmd)
+		if error is not None:
+			return error
+	return None
+
+def check_valid_commit(look_cmd, log_message, registry=None) :
+	error = validate_commit(look_cmd, log_message, registry)
+	if error is not None:
+		sys.stderr.write(error)
+		return False
 	return True
 	
-def run(command, use_revision, operation_id, message):
-	log_message = ""
-	look_cmd = command
-		
-	if use_revision:		
-		look_cmd = look_cmd % ("%s", "-r", operation_id)
-	else:
-		look_cmd = look_cmd % ("%s", "-t", operation_id)
-		
-	if  message is None:
-		log_message = get_log_message(look_cmd)	
-	else:
-		log_message = message
+def run(backend, repository, use_revision, operation_id, message, registry=None):
+	# the backend is reused for every svnlook call, and across commits by
+	# long running callers
+	def look_cmd(subcommand, lines=False):
+		if lines:
+			return backend.lookLines(repository, use_revision, operation_id, subcommand)
+		return backend.look(repository, use_revision, operation_id, subcommand)
+
+	log_message = message
+	if log_message is None:
+		log_message = get_log_message(look_cmd)
 
-	if check_valid_commit(look_cmd, log_message):
+	if check_valid_commit(look_cmd, log_message, registry):
 		return 0
 	return 1
 
+# backend name -> backend, a worker keeps them across the commits it checks
+_backends = {}
 
-def mainold():
-	usage = "usage: %prog <repository-path> [options]"
-	parser = OptionParser(usage=usage)
+def get_backend(name):
+	backend = _backends.get(name)
+	if backend is None:
+		backend = _backends[name] = SvnBackend.create(name)
+	return backend
+
+# snapshot path -> registry, kept mapped across commits like the backends
+_registries = {}
 
+def get_registry(snapshot_path):
+	if snapshot_path is None:
+		return None
+	registry = _registries.get(snapshot_path)
+	if registry is None:
+		registry = _registries[snapshot_path] = TicketRegistry.create(snapshot_path)
+	return registry
+
+def write_registry(snapshot_path, export_path):
+	# the snapshot of a tracker export listing the open tickets, one a line
+	if snapshot_path is None:
+		sys.stderr.write("[ERROR] The registry to write must be given with --registry.")
+		return 1
+	if export_path == "-":
+		count = TicketRegistry.write(snapshot_path, TicketRegistry.parseTickets(sys.stdin))
+	else:
+		with open(export_path, "r") as fin:
+			count = TicketRegistry.write(snapshot_path, TicketRegistry.parseTickets(fin))
+	sys.stdout.write("Registered [%d] tickets in [%s]\n" % (count, snapshot_path))
+	return 0
+
+def rules_digest():
+	# an audit checkpoint is only resumed with the rules it was written by
+	with open(os.path.abspath(__file__), "rb") as fin:
+		return hashlib.sha1(fin.read()).hexdigest()
+
+def audit(opts, repository):
+	# svn log takes urls, a local repository path is made one
+	if not "://" in repository:
+		repository = "file://" + os.path.abspath(repository)
+	try:
+		history = LogAudit.create(opts.backend, repository, validate_commit, opts.registry)
+		bounds = SvnBackend.parseRange(opts.audit, lambda: history_head(opts.backend, repository))
+		if bounds is None:
+			sys.stderr.write("[ERROR] The audit range [%s] is not a <revision>:<revision> range." % opts.audit)
+			return 1
+		settings = {
+			"repository": repository,
+			"start": min(bounds),
+			"rules": rules_digest(),
+			"registry": opts.registry
+		}
+		return history.run(min(bounds), max(bounds), opts.output, settings, opts.jobs, opts.chunk_size)
+	except TicketRegistry.RegistryError as e:
+		sys.stderr.write("[ERROR] %s" % str(e))
+		return 1
+
+def history_head(backend_name, repository):
+	return get_backend(backend_name).headRevision(repository)
+
+def add_commit_options(parser):
 	parser.add_option("-r", "--revision", dest="revision", help="revision id, required if transaction id is not specified", metavar="REVISION_ID", default=None)
 	parser.add_option("-t", "--transaction", dest="transaction", help="transaction id, required if revision id is not specified", metavar="TRANSACTION_ID", default=None)	
 	parser.add_option("-m", "--message", dest="message", help="log message, used for dry runs against revision id's", metavar="LOG_MESSAGE", default=None)
+
+def check_hook(arguments, cwd, backend_name, registry_path):
+	# the commit a worker checks for the hook client: the repository path and
+	# -r, -t or -m only, the backend and the registry are the ones the pool
+	# was started with. Nothing else a client sends reaches the checks
+	usage = "usage: %prog <repository-path> -r REVISION_ID|-t TRANSACTION_ID [-m LOG_MESSAGE]"
+	parser = OptionParser(usage=usage, add_help_option=False)
+	add_commit_options(parser)
 	
-	(opts, args) = parser.parse_args()
+	(opts, args) = parser.parse_args(arguments)
 	
-	if(len(args)<=0):
-		sys.stderr.write("[ERROR] Log message check missing required repository path argument.")
+	if len(args) != 1:
+		sys.stderr.write("[ERROR] The worker checks the commit of one repository path.")
 		parser.print_help()
 		return 1
 	
@@ -163,23 +291,102 @@ def mainold():
 		parser.print_help()
 		return 1
 	
-	look_cmd = "svnlook %s %s %s %s"  % ("%s", args[0], "%s", "%s")
+	# a relative path is the one of the client, the worker does not follow it
+	repository = args[0]
+	if cwd is not None:
+		repository = os.path.join(cwd, repository)
+	
 	use_revision = opts.transaction is None
 	operation_id = opts.revision if use_revision else opts.transaction
-	return run(look_cmd, use_revision, operation_id, opts.message)
+	try:
+		return run(get_backend(backend_name), repository, use_revision, operation_id, opts.message, get_registry(registry_path))
+	except SvnBackend.SvnError as e:
+		sys.stderr.write("[ERROR] %s" % str(e))
+		return 1
 
-def main():
+def mainold(arguments=None):
 	usage = "usage: %prog <repository-path> [options]"
 	parser = OptionParser(usage=usage)
 
-	parser.add_option("-m", "--message", dest="message", help="log message, used for dry runs against revision id's", metavar="LOG_MESSAGE", default=None)
+	add_commit_options(parser)
+	parser.add_option("--show-reference", dest="show_reference", help="show the project reference of the -m message instead of checking a commit", action="store_true", default=False)
+	parser.add_option("-b", "--backend", dest="backend", help="svn backend: cli, bindings or replay:<capture-folder>", metavar="BACKEND", default="cli")
+	parser.add_option("-w", "--worker", dest="worker", help="serve the checks of svn_check_log_message_client.py instead of checking a commit", action="store_true", default=False)
+	parser.add_option("--workers", dest="workers", help="number of worker processes, defaults to the number of cpus", metavar="COUNT", type="int", default=os.cpu_count() or 1)
+	parser.add_option("--socket", dest="socket", help="unix socket the workers listen on, the client finds it in SVN_CHECK_LOG_MESSAGE_SOCKET", metavar="SOCKET_PATH", default=os.environ.get("SVN_CHECK_LOG_MESSAGE_SOCKET", HookWorker.SOCKET_PATH))
+	
+	parser.add_option("--registry", dest="registry", help="snapshot of the open tickets, referenced tickets must be in it; defaults to SVN_CHECK_LOG_MESSAGE_REGISTRY except for audits", metavar="SNAPSHOT", default=None)
+	parser.add_option("--write-registry", dest="write_registry", help="write the --registry snapshot from a tracker export listing the open tickets, - reads standard input", metavar="EXPORT", default=None)
 	
-	(opts, args) = parser.parse_args()
+	parser.add_option("--audit", dest="audit", help="audit the revisions of a range, e.g. 1:HEAD, instead of checking a commit; the repository may be a url", metavar="RANGE", default=None)
+	parser.add_option("--output", dest="output", help="ndjson file the audit writes the violations to, its checkpoint is kept beside it", metavar="FILE", default="svn_check_log_message_audit.ndjson")
+	parser.add_option("--jobs", dest="jobs", help="number of audit processes, defaults to the number of cpus", metavar="COUNT", type="int", default=os.cpu_count() or 1)
+	parser.add_option("--chunk-size", dest="chunk_size", help="revisions an audit process reads with one svn log call", metavar="COUNT", type="int", default=1000)
+	
+	(opts, args) = parser.parse_args(arguments)
+	
+	# the snapshot holds the open tickets only, an audit of the history
+	# checks against it only when told so
+	registry_path = opts.registry
+	if registry_path is None and opts.audit is None:
+		registry_path = os.environ.get("SVN_CHECK_LOG_MESSAGE_REGISTRY")
+	
+	if opts.show_reference:
+		return show_reference(opts.message)
+	
+	if opts.write_registry is not None:
+		return write_registry(registry_path, opts.write_registry)
+	
+	if opts.worker:
+		# the workers inherit the backend, a broken one fails the pool at once
+		try:
+			get_backend(opts.backend)
+		except SvnBackend.SvnError as e:
+			sys.stderr.write("[ERROR] %s" % str(e))
+			return 1
+		return HookWorker.create(opts.socket, opts.workers,
+			lambda hook_arguments, cwd: check_hook(hook_arguments, cwd, opts.backend, registry_path)).serve()
+	
+	if(len(args)<=0):
+		sys.stderr.write("[ERROR] Log message check missing required repository path argument.")
+		parser.print_help()
+		return 1
+	
+	if opts.audit is not None:
+		try:
+			return audit(opts, args[0])
+		except SvnBackend.SvnError as e:
+			sys.stderr.write("[ERROR] %s" % str(e))
+			return 1
+	
+	if opts.revision is None and opts.transaction is None:
+		sys.stderr.write("[ERROR] Either revision id or transaction id must be specified.")
+		parser.print_help()
+		return 1
+	
+	try:
+		backend = get_backend(opts.backend)
+	except SvnBackend.SvnError as e:
+		sys.stderr.write("[ERROR] %s" % str(e))
+		return 1
+
+	use_revision = opts.transaction is None
+	operation_id = opts.revision if use_revision else opts.transaction
+	try:
+		return run(backend, args[0], use_revision, operation_id, opts.message, get_registry(registry_path))
+	except SvnBackend.SvnError as e:
+		sys.stderr.write("[ERROR] %s" % str(e))
+		return 1
+
+def show_reference(message):
+	if message is None:
+		sys.stderr.write("[ERROR] The message to show the reference of must be given with -m.")
+		return 1
 	
-	sys.stdout.write(opts.message);
+	sys.stdout.write(message);
 	sys.stdout.write("\n");
-	sys.stdout.write(get_project_reference(opts.message));	
+	sys.stdout.write(get_project_reference(message));	
 	return 0;
 
 if __name__ == "__main__":
-	sys.exit(main())
+	sys.exit(mainold())
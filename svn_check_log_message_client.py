@@ -0,0 +1,29 @@
+import sys
+import os
+import modules.SocketFrames as SocketFrames
+
+# the pre-commit hook when svn_check_log_message.py --worker runs: hands the
+# hook arguments to a worker and relays its answer, so a commit does not pay
+# for starting the checks. Takes the repository path and -r, -t or -m; the
+# worker checks with the backend and the registry it was started with. When
+# no worker listens the commit is checked in process.
+#
+#   REPOS="$1"
+#   TXN="$2"
+#   python3 svn_check_log_message_client.py "$REPOS" -t "$TXN" || exit 1
+
+# as HookWorker.SOCKET_PATH, the checks are not imported unless needed
+SOCKET_PATH = "/tmp/svn_check_log_message.sock"
+
+def main():
+	arguments = sys.argv[1:]
+	message = {"arguments": arguments, "cwd": os.getcwd()}
+	code = SocketFrames.request(os.environ.get("SVN_CHECK_LOG_MESSAGE_SOCKET", SOCKET_PATH), message,
+		stopped="[ERROR] The log message check worker stopped unexpectedly.")
+	if code is None:
+		import svn_check_log_message
+		code = svn_check_log_message.mainold(arguments)
+	return code
+
+if __name__ == "__main__":
+	sys.exit(main())
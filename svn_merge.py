@@ -25,11 +25,19 @@ config = {
 	},
 
 	# List of file paths starting from the root of the project that will be ignored
-	# when collisions are detected for these files
+	# when collisions are detected for these files; a path ending with '/' ignores
+	# everything below it, globs like "/WebContent/*.min.js" are matched too
 	"ignore_file_list": [
 		"/WebContent/index.html"
 	],
 
+	# optional: several source paths merged into their own working copies,
+	# analysed together in one run; replaces trunk and local when present
+	# "merge_pairs": [
+	# 	{"source": "/trunk/<project-name>", "target": "<path_to_release_wc>"},
+	# 	{"source": "/branches/<feature>", "target": "<path_to_project>"}
+	# ],
+
 	# just somewhere to dump logs  
 	"temp_folder": "<path_to_temp_folder>"
 
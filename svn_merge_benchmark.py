@@ -0,0 +1,123 @@
+# Offline benchmark of the merge analysis phases on a synthetic history
+
+# sample call:
+# python svn_merge_benchmark.py --revisions=50000 --files-per-commit=4 --targets=20
+
+import sys, getopt, io, json, time, random, resource
+import modules.SyntheticLog as SyntheticLog
+import modules.CommitModel as CommitModel
+import modules.CollisionClosure as CollisionClosure
+import modules.SvnLog as SvnLog
+import modules.PhaseTimer as PhaseTimer
+
+SETTINGS = {
+	'--revisions': ('revisions', int),
+	'--files': ('files', int),
+	'--files-per-commit': ('files_per_commit', float),
+	'--hot-file-skew': ('hot_file_skew', float),
+	'--refactor-rate': ('refactor_rate', float),
+	'--commits-per-ticket': ('commits_per_ticket', int),
+	'--ticket-spread': ('ticket_spread', float),
+	'--merged-fraction': ('merged_fraction', float),
+	'--mergeinfo-fragments': ('mergeinfo_fragments', int),
+	'--seed': ('seed', int)
+}
+
+def usage():
+	print('usage: svn_merge_benchmark.py [--revisions=<n>] [--files=<n>] [--files-per-commit=<n>] [--hot-file-skew=<s>]')
+	print('           [--refactor-rate=<r>] [--commits-per-ticket=<n>] [--ticket-spread=<n>] [--merged-fraction=<f>]')
+	print('           [--mergeinfo-fragments=<n>] [--targets=<n>] [--seed=<n>] [--trace-memory] [--json]')
+	sys.exit(2)
+
+def main(argv):
+	settings = {}
+	target_count = 10
+	trace_memory = False
+	as_json = False
+	try:
+		opts, args = getopt.getopt(argv, 'h', [o[2:] + '=' for o in SETTINGS] + ['targets=', 'trace-memory', 'json'])
+	except getopt.GetoptError:
+		usage()
+	for opt, arg in opts:
+		try:
+			if opt == '-h':
+				usage()
+			elif opt in SETTINGS:
+				key, convert = SETTINGS[opt]
+				settings[key] = convert(arg)
+			elif opt == '--targets':
+				target_count = int(arg)
+			elif opt == '--trace-memory':
+				trace_memory = True
+			elif opt == '--json':
+				as_json = True
+		except ValueError:
+			usage()
+
+	start = time.perf_counter()
+	history = SyntheticLog.create(settings)
+	log_text = history.logText()
+	log_xml = history.logXml()
+	merge_info = history.mergeInfo()
+	generated = time.perf_counter() - start
+
+	timer = PhaseTimer.create(True, trace_memory)
+	paths = CommitModel.PathTable()
+	trunk = SyntheticLog.DEFAULTS['trunk']
+
+	with timer.phase('parse_log') as phase:
+		commits = SvnLog.parseLog(log_text, paths)
+		phase['items'] = len(commits)
+	with timer.phase('parse_xml_log') as phase:
+		phase['items'] = len(list(SvnLog.iterParseLog(io.BytesIO(log_xml), CommitModel.PathTable())))
+	with timer.phase('parse_mergeinfo') as phase:
+		ranges = SvnLog.parseMergeInfo(merge_info)[trunk]
+		phase['items'] = len(ranges['from'])
+	with timer.phase('filter_merged') as phase:
+		unmerged, positions = SvnLog.filterMerged(commits, ranges)
+		phase['items'] = len(unmerged)
+	with timer.phase('index') as phase:
+		trie = CommitModel.PathTrie()
+		trie.update(paths)
+		index = CollisionClosure.indexCommits(unmerged, positions, trie)
+		phase['items'] = len(paths)
+
+	# targets are drawn from the most recent unmerged commits, where the
+	# closures are the largest
+	rnd = random.Random(settings.get('seed', SyntheticLog.DEFAULTS['seed']))
+	recent = [c.revision for c in unmerged[-max(1, len(unmerged) // 10):]]
+	targets = rnd.sample(recent, min(target_count, len(recent)))
+	with timer.phase('collision_closure') as phase:
+		closure = CollisionClosure.create(unmerged, index, set(), set())
+		phase['items'] = sum([len(closure.run([target])) for target in targets])
+	timer.stop()
+	phases = timer.phases()
+
+	result = {}
+	result['settings'] = dict(SyntheticLog.DEFAULTS, **settings)
+	result['targets'] = len(targets)
+	result['log_bytes'] = len(log_text)
+	result['generate_seconds'] = round(generated, 4)
+	result['phases'] = phases
+	# kilobytes on linux
+	result['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 2)
+
+	if as_json:
+		print(json.dumps(result))
+		return
+
+	print('---------------------------------------------------------------')
+	print('Synthetic history: ['+str(len(commits))+'] revisions, ['+str(len(paths))+'] files, ['
+		+ str(len(log_text) // 1024) + '] KB of log, generated in ['+str(result['generate_seconds'])+'] s')
+	print('---------------------------------------------------------------')
+	for phase in phases:
+		line = ' * ' + phase['phase'].ljust(20) + str(round(phase['wall_seconds'], 4)).rjust(10) + ' s'
+		line = line + str(round(phase['cpu_seconds'], 4)).rjust(10) + ' s cpu' + str(phase['items']).rjust(12) + ' items'
+		if 'peak_memory_bytes' in phase:
+			line = line + str(round(phase['peak_memory_bytes'] / 1048576.0, 2)).rjust(10) + ' MB peak'
+		print(line)
+	print('---------------------------------------------------------------')
+	print('Max RSS: ['+str(result['max_rss_mb'])+'] MB')
+
+if __name__ == '__main__':
+	main(sys.argv[1:])